@@ -1,21 +1,46 @@
 import http.server
 import json
 import sqlite3
-import mimetypes
-import os
 from urllib.parse import urlparse, parse_qs
 import csv
 import io
 from datetime import datetime
 
-from config import DB_FILE, FRONTEND_DIR, INDEX_PATH
+from config import (
+    HTTP_REQUEST_TIMEOUT, API_CACHE_CONTROL, API_DEFAULT_CACHE_CONTROL,
+    STATIC_IMMUTABLE_CACHE_CONTROL, STATIC_DEFAULT_CACHE_CONTROL, SOLUTION_RATING_PER_DIFFICULTY
+)
 from database import verify_password, hash_password
+from db_pool import pool, get_connection
+from leaderboard import leaderboard
+from counters import counters
+from problem_catalog import problem_catalog
+from problem_sampler import problem_sampler
+from user_cache import user_profiles
+from user_stats import load_user_stats
+from lobby import lobby
+from matchmaking import matchmaker, has_open_match, match_started_message, MATCH_DETAILS_QUERY
+from match_results import judge_answers, finish_match, publish_match_finished
+from match_expiry import match_expiry
+from http_utils import make_etag, gzip_etag, etag_matches, accepts_gzip, should_gzip, gzip_body, cached_etag, cached_gzip
+from static_assets import static_assets
 
-mimetypes.init()
+CACHE_CONTROL_PREFIXES = sorted(API_CACHE_CONTROL.items(), key=lambda item: len(item[0]), reverse=True)
+
+def cache_control_for(path):
+    for prefix, value in CACHE_CONTROL_PREFIXES:
+        if path.startswith(prefix):
+            return value
+    return API_DEFAULT_CACHE_CONTROL
 
 class OlympiadHandler(http.server.BaseHTTPRequestHandler):
-    def __init__(self, *args, ws_server_instance=None, **kwargs):
+    timeout = HTTP_REQUEST_TIMEOUT
+
+    def __init__(self, *args, ws_server_instance=None, bus=None, **kwargs):
+        # ws_server_instance is only set when the WebSocket server runs in this
+        # process; broadcasts always go through the bus.
         self.ws_server = ws_server_instance
+        self.bus = bus
         super().__init__(*args, **kwargs)
     
     def do_OPTIONS(self):
@@ -46,6 +71,9 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
                 self.send_error(404)
         elif path == '/api/leaderboard':
             self.send_api_response(self.get_leaderboard())
+        elif path.startswith('/api/leaderboard/user/'):
+            user_id = path.split('/')[-1]
+            self.send_api_response(self.get_leaderboard_position(user_id))
         elif path == '/api/matches':
             self.send_api_response(self.get_active_matches())
         elif path.startswith('/api/match/'):
@@ -58,6 +86,8 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             self.send_api_response(self.get_user_achievements(user_id))
         elif path == '/api/export/problems':
             self.export_problems()
+        elif path == '/api/server/stats':
+            self.send_api_response(self.get_server_stats())
         else:
             self.serve_static_file(path)
     
@@ -87,6 +117,8 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             response = self.create_match(data)
         elif path == '/api/match/join':
             response = self.join_match(data)
+        elif path == '/api/match/queue':
+            response = self.queue_match(data)
         elif path == '/api/match/submit':
             response = self.submit_match_answer(data)
         elif path == '/api/admin/add_problem':
@@ -113,92 +145,32 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         category = query_params.get('category', [None])[0]
         difficulty = query_params.get('difficulty', [None])[0]
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        query = "SELECT id, title, description, difficulty, category, tags FROM problems WHERE 1=1"
-        params = []
-        
-        if category:
-            query += " AND category = ?"
-            params.append(category)
-        if difficulty:
-            query += " AND difficulty = ?"
-            params.append(int(difficulty))
-        
-        query += " ORDER BY difficulty, id"
-        cursor.execute(query, params)
-        
-        problems = []
-        for row in cursor.fetchall():
-            problems.append({
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'difficulty': row[3],
-                'difficulty_text': ['Легкая', 'Средняя', 'Сложная'][row[3]-1] if row[3] in [1,2,3] else 'Неизвестно',
-                'category': row[4],
-                'tags': row[5].split(',') if row[5] else []
-            })
-        
-        conn.close()
-        return {'success': True, 'problems': problems}
+        return problem_catalog.list_json(category or None, int(difficulty) if difficulty else None)
     
     def get_problem(self, problem_id):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        problem = problem_catalog.get(problem_id)
         
-        cursor.execute("""
-            SELECT id, title, description, answer, difficulty, category, tags
-            FROM problems WHERE id = ?
-        """, (problem_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
+        if not problem:
             return {'success': False, 'error': 'Задача не найдена'}
         
         return {
             'success': True,
-            'problem': {
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'answer': row[3],
-                'difficulty': row[4],
-                'difficulty_text': ['Легкая', 'Средняя', 'Сложная'][row[4]-1] if row[4] in [1,2,3] else 'Неизвестно',
-                'category': row[5],
-                'tags': row[6].split(',') if row[6] else []
-            }
+            'problem': dict(problem)
         }
     
     def get_platform_stats(self):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        users_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM problems")
-        problems_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM solutions WHERE is_correct = 1")
-        correct_solutions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM matches WHERE status = 'finished'")
-        matches_played = cursor.fetchone()[0]
-        
-        conn.close()
-        
         return {
             'success': True,
-            'stats': {
-                'users_count': users_count,
-                'problems_count': problems_count,
-                'correct_solutions': correct_solutions,
-                'matches_played': matches_played
-            }
+            'stats': counters.snapshot()
+        }
+    
+    def get_server_stats(self):
+        return {
+            'success': True,
+            'db_pool': pool.metrics(),
+            'websocket': self.ws_server.stats() if self.ws_server else None,
+            'matchmaking': matchmaker.stats(),
+            'match_expiry': match_expiry.stats()
         }
     
     def get_user_stats(self, user_id):
@@ -207,125 +179,37 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         except:
             return {'success': False, 'error': 'Invalid user ID'}
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT username, rating, role, total_xp, level FROM users WHERE id = ?", (user_id,))
-        user_info = cursor.fetchone()
-        
-        if not user_info:
-            conn.close()
+        user = load_user_stats(user_id)
+        if not user:
             return {'success': False, 'error': 'User not found'}
+        return {'success': True, 'user': user}
+    
+    def get_leaderboard(self):
+        query_params = parse_qs(urlparse(self.path).query)
+        try:
+            limit = min(max(int(query_params.get('limit', [50])[0]), 1), 500)
+        except ValueError:
+            limit = 50
         
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as correct,
-                AVG(time_spent) as avg_time
-            FROM solutions 
-            WHERE user_id = ?
-        """, (user_id,))
-        
-        stats = cursor.fetchone()
-        total = stats[0] or 0
-        correct = stats[1] or 0
-        avg_time = stats[2] or 0
-        
-        cursor.execute("""
-            SELECT 
-                p.category,
-                COUNT(*) as total,
-                SUM(CASE WHEN s.is_correct THEN 1 ELSE 0 END) as correct
-            FROM solutions s
-            JOIN problems p ON s.problem_id = p.id
-            WHERE s.user_id = ?
-            GROUP BY p.category
-            ORDER BY total DESC
-        """, (user_id,))
-        
-        categories = []
-        for row in cursor.fetchall():
-            categories.append({
-                'category': row[0],
-                'total': row[1],
-                'correct': row[2],
-                'accuracy': round((row[2]/row[1]*100), 2) if row[1] > 0 else 0
-            })
-        
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_matches,
-                SUM(CASE WHEN winner_id = ? THEN 1 ELSE 0 END) as wins
-            FROM matches
-            WHERE (player1_id = ? OR player2_id = ?) AND status = 'finished'
-        """, (user_id, user_id, user_id))
-        
-        pvp_stats = cursor.fetchone()
-        total_matches = pvp_stats[0] or 0
-        wins = pvp_stats[1] or 0
+        return {'success': True, 'leaderboard': leaderboard.top(limit)}
+    
+    def get_leaderboard_position(self, user_id):
+        try:
+            user_id = int(user_id)
+        except:
+            return {'success': False, 'error': 'Invalid user ID'}
         
-        conn.close()
+        rank = leaderboard.rank(user_id)
+        if rank is None:
+            return {'success': False, 'error': 'User not found'}
         
         return {
             'success': True,
-            'user': {
-                'id': user_id,
-                'username': user_info[0],
-                'rating': user_info[1],
-                'role': user_info[2],
-                'xp': user_info[3],
-                'level': user_info[4],
-                'stats': {
-                    'total_problems': total,
-                    'correct_answers': correct,
-                    'accuracy': round((correct/total*100), 2) if total > 0 else 0,
-                    'avg_time': round(avg_time, 2),
-                    'pvp_matches': total_matches,
-                    'pvp_wins': wins,
-                    'pvp_winrate': round((wins/total_matches*100), 2) if total_matches > 0 else 0
-                },
-                'categories': categories
-            }
+            'rank': rank,
+            'total': leaderboard.size(),
+            'around': leaderboard.around(user_id)
         }
     
-    def get_leaderboard(self):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT u.id, u.username, u.rating, u.level,
-                   COUNT(s.id) as solved,
-                   SUM(CASE WHEN s.is_correct THEN 1 ELSE 0 END) as correct
-            FROM users u
-            LEFT JOIN solutions s ON u.id = s.user_id
-            GROUP BY u.id
-            ORDER BY u.rating DESC
-            LIMIT 50
-        """
-        )
-        
-        leaderboard = []
-        rank = 1
-        for row in cursor.fetchall():
-            total = row[4] or 0
-            correct = row[5] or 0
-            accuracy = round((correct/total*100), 2) if total > 0 else 0
-            
-            leaderboard.append({
-                'rank': rank,
-                'id': row[0],
-                'username': row[1],
-                'rating': row[2],
-                'level': row[3],
-                'solved': total,
-                'correct': correct,
-                'accuracy': accuracy
-            })
-            rank += 1
-        
-        conn.close()
-        return {'success': True, 'leaderboard': leaderboard}
-    
     def register_user(self, data):
         username = data.get('username', '').strip()
         email = data.get('email', '').strip()
@@ -337,7 +221,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         if len(password) < 6:
             return {'success': False, 'error': 'Пароль должен содержать минимум 6 символов'}
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
@@ -371,6 +255,9 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         
         conn.close()
         
+        leaderboard.add_user(user[0], user[1], user[2])
+        counters.increment('users_count')
+        
         return {
             'success': True,
             'message': 'Регистрация успешна!',
@@ -386,7 +273,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         username = data.get('username', '').strip()
         password = data.get('password', '').strip()
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -433,19 +320,17 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         except:
             return {'success': False, 'error': 'Invalid IDs'}
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT answer, difficulty FROM problems WHERE id = ?", (problem_id,))
-        problem = cursor.fetchone()
+        problem = problem_catalog.get(problem_id)
         
         if not problem:
-            conn.close()
             return {'success': False, 'error': 'Задача не найдена'}
         
-        correct_answer = str(problem[0]).strip().lower()
+        correct_answer = str(problem['answer']).strip().lower()
         user_answer = answer.strip().lower()
-        difficulty = problem[1]
+        difficulty = problem['difficulty']
+        
+        conn = get_connection()
+        cursor = conn.cursor()
         
         is_correct = user_answer == correct_answer
         
@@ -455,24 +340,22 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             (user_id, problem_id, answer, is_correct, time_spent)
         )
         
+        rating_change = difficulty * SOLUTION_RATING_PER_DIFFICULTY if is_correct else 0
         xp_gained = 0
         if is_correct:
-            rating_change = difficulty * 10
             xp_gained = difficulty * 50
             
             cursor.execute(
-                "UPDATE users SET rating = rating + ?, total_xp = total_xp + ? WHERE id = ?",
+                "UPDATE users SET rating = rating + ?, total_xp = total_xp + ? WHERE id = ? RETURNING rating, total_xp, level",
                 (rating_change, xp_gained, user_id)
             )
-            
-            cursor.execute("SELECT total_xp, level FROM users WHERE id = ?", (user_id,))
-            user_data = cursor.fetchone()
-            current_xp = user_data[0]
-            current_level = user_data[1]
+            new_rating, current_xp, current_level = cursor.fetchone()
             new_level = 1 + (current_xp // 1000)
             
             if new_level > current_level:
                 cursor.execute("UPDATE users SET level = ? WHERE id = ?", (new_level, user_id))
+            else:
+                new_level = current_level
             
             cursor.execute("""
                 UPDATE user_stats 
@@ -497,11 +380,20 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        if is_correct:
+            leaderboard.record_solution(user_id, True, new_rating, new_level)
+            user_profiles.invalidate(user_id)
+            counters.increment('correct_solutions')
+        else:
+            leaderboard.record_solution(user_id, False)
+        if self.bus:
+            self.bus.notify_stats_changed(user_id)
+        
         return {
             'success': True,
             'correct': is_correct,
             'correct_answer': correct_answer,
-            'rating_change': difficulty * 10 if is_correct else 0,
+            'rating_change': rating_change,
             'xp_gained': xp_gained
         }
     
@@ -551,7 +443,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
                     pass
     
     def get_achievements(self):
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -580,7 +472,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         except:
             return {'success': False, 'error': 'Invalid user ID'}
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -605,7 +497,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         return {'success': True, 'achievements': achievements}
     
     def get_users(self):
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -642,7 +534,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
     def add_problem(self, data):
         user_id = data.get('user_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -679,13 +571,16 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        counters.increment('problems_count')
+        problem_catalog.load()
+        
         return {'success': True, 'message': 'Задача успешно добавлена'}
     
     def edit_problem(self, data):
         user_id = data.get('user_id')
         problem_id = data.get('problem_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -706,13 +601,15 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        problem_catalog.load()
+        
         return {'success': True, 'message': 'Задача обновлена'}
     
     def delete_problem(self, data):
         user_id = data.get('user_id')
         problem_id = data.get('problem_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -728,12 +625,17 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        leaderboard.load()
+        counters.load()
+        problem_catalog.load()
+        lobby.load()
+        
         return {'success': True, 'message': 'Задача удалена'}
     
     def admin_add_user(self, data):
         user_id = data.get('admin_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -770,15 +672,21 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             (new_user_id,)
         )
         
+        cursor.execute("SELECT rating FROM users WHERE id = ?", (new_user_id,))
+        new_rating = cursor.fetchone()[0]
+        
         conn.commit()
         conn.close()
         
+        leaderboard.add_user(new_user_id, username, new_rating)
+        counters.increment('users_count')
+        
         return {'success': True, 'message': f'Пользователь {username} создан'}
     
     def admin_update_user(self, data):
         user_id = data.get('admin_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -810,6 +718,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             updates.append("role = ?")
             params.append(new_role)
         
+        rating = None
         if new_rating is not None:
             try:
                 rating = int(new_rating)
@@ -825,13 +734,19 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             conn.commit()
         
         conn.close()
+        
+        if rating is not None:
+            leaderboard.set_rating(int(target_id), rating)
+        user_profiles.invalidate(int(target_id))
+        if self.bus:
+            self.bus.notify_stats_changed(int(target_id))
         return {'success': True, 'message': 'Данные пользователя обновлены'}
     
     def admin_delete_user(self, data):
         user_id = data.get('admin_id')
         target_id = data.get('user_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -865,40 +780,15 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        leaderboard.remove_user(int(target_id))
+        user_profiles.invalidate(int(target_id))
+        counters.load()
+        lobby.load()
+        
         return {'success': True, 'message': f'Пользователь {target_user[0]} удален'}
     
     def get_active_matches(self):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT m.id, m.status, m.started_at,
-                   p1.username as player1,
-                   p2.username as player2,
-                   p.title as problem_title
-            FROM matches m
-            JOIN users p1 ON m.player1_id = p1.id
-            LEFT JOIN users p2 ON m.player2_id = p2.id
-            LEFT JOIN problems p ON m.problem_id = p.id
-            WHERE m.status IN ('waiting', 'active')
-            ORDER BY m.started_at DESC
-            LIMIT 20
-        """
-        )
-        
-        matches = []
-        for row in cursor.fetchall():
-            matches.append({
-                'id': row[0],
-                'status': row[1],
-                'started_at': row[2],
-                'player1': row[3],
-                'player2': row[4] or 'Ожидание...',
-                'problem': row[5] or 'Не выбрана'
-            })
-        
-        conn.close()
-        return {'success': True, 'matches': matches}
+        return {'success': True, 'matches': lobby.list()}
     
     def get_match_details(self, match_id):
         try:
@@ -906,7 +796,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         except:
             return {'success': False, 'error': 'Invalid match ID'}
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -954,17 +844,13 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
     def create_match(self, data):
         user_id = data.get('user_id')
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM problems ORDER BY RANDOM() LIMIT 1")
-        problem = cursor.fetchone()
+        problem_id = problem_sampler.pick([user_id], leaderboard.rating(user_id), data.get('category'))
         
-        if not problem:
-            conn.close()
+        if problem_id is None:
             return {'success': False, 'error': 'Нет доступных задач'}
         
-        problem_id = problem[0]
+        conn = get_connection()
+        cursor = conn.cursor()
         
         cursor.execute(
             """INSERT INTO matches (player1_id, problem_id, status) 
@@ -975,7 +861,21 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         match_id = cursor.lastrowid
         
         conn.commit()
+        problem_sampler.record(problem_id, user_id)
+        matchmaker.dequeue(user_id)
+
+        cursor.execute("""
+            SELECT m.started_at, u.username
+            FROM matches m
+            JOIN users u ON m.player1_id = u.id
+            WHERE m.id = ?
+        """, (match_id,))
+        created = cursor.fetchone()
         conn.close()
+
+        if created:
+            problem = problem_catalog.get(problem_id)
+            lobby.match_created(match_id, created[0], created[1], problem['title'] if problem else None)
         
         return {
             'success': True,
@@ -987,7 +887,7 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         user_id = data.get('user_id')
         match_id = data.get('match_id')
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT player1_id, status FROM matches WHERE id = ?", (match_id,))
@@ -1005,181 +905,152 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
             conn.close()
             return {'success': False, 'error': 'Нельзя присоединиться к своему матчу'}
         
+        # Only one of several concurrent joins can take the waiting match
         cursor.execute(
-            "UPDATE matches SET player2_id = ?, status = 'active', started_at = CURRENT_TIMESTAMP WHERE id = ?",
+            """UPDATE matches SET player2_id = ?, status = 'active', started_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND status = 'waiting' AND player2_id IS NULL""",
             (user_id, match_id)
         )
         
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return {'success': False, 'error': 'Матч уже начат или завершен'}
+        
         conn.commit()
 
-        cursor.execute("""
-            SELECT m.id, m.status, m.problem_id, m.player1_id, m.player2_id,
-                   p.title, p.description, p.difficulty, p.category,
-                   u1.username as player1_username,
-                   u2.username as player2_username
-            FROM matches m
-            LEFT JOIN problems p ON m.problem_id = p.id
-            LEFT JOIN users u1 ON m.player1_id = u1.id
-            LEFT JOIN users u2 ON m.player2_id = u2.id
-            WHERE m.id = ?
-        """, (match_id,))
+        cursor.execute(MATCH_DETAILS_QUERY, (match_id,))
         updated_match = cursor.fetchone()
 
-        if updated_match and self.ws_server:
-            match_data = {
-                'type': 'match_started',
-                'match_id': updated_match[0],
-                'player1_id': updated_match[3],
-                'player2_id': updated_match[4],
-                'player1_username': updated_match[9],
-                'player2_username': updated_match[10],
-                'problem': {
-                    'title': updated_match[5],
-                    'description': updated_match[6],
-                    'difficulty': updated_match[7],
-                    'category': updated_match[8]
-                }
-            }
-            self.ws_server.broadcast_to_match(match_id, match_data)
+        if updated_match:
+            problem_sampler.record(updated_match[2], user_id)
+            matchmaker.dequeue(user_id)
+            lobby.match_joined(updated_match[0], updated_match[11], updated_match[10], updated_match[9], updated_match[5])
+
+        if updated_match and self.bus:
+            self.bus.broadcast_to_match(match_id, match_started_message(updated_match))
         
         conn.close()
         
         return {'success': True, 'message': 'Вы присоединились к матчу!'}
     
+    def queue_match(self, data):
+        user_id = data.get('user_id')
+        action = data.get('action', 'enqueue')
+        
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return {'success': False, 'error': 'Invalid user ID'}
+        
+        if action == 'dequeue':
+            matchmaker.dequeue(user_id)
+            return {'success': True, 'queued': False, 'message': 'Поиск соперника отменен'}
+        
+        rating = leaderboard.rating(user_id)
+        if rating is None:
+            return {'success': False, 'error': 'Пользователь не найден'}
+        
+        if has_open_match(user_id):
+            return {'success': False, 'error': 'Вы уже участвуете в матче'}
+        
+        opponent_id = matchmaker.enqueue(user_id, rating)
+        if opponent_id is None:
+            return {'success': True, 'queued': True, 'message': 'Ищем соперника...'}
+        
+        match_id = matchmaker.start_match(opponent_id, user_id)
+        if match_id is None:
+            return {'success': False, 'error': 'Не удалось создать матч, попробуйте еще раз'}
+        
+        return {'success': True, 'queued': False, 'match_id': match_id, 'message': 'Соперник найден!'}
+    
     def submit_match_answer(self, data):
         user_id = data.get('user_id')
         match_id = data.get('match_id')
         answer = data.get('answer', '').strip()
         time_spent = data.get('time_spent', 0)
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
+        # The write lock is taken up front, so the two answers of a match are
+        # recorded one after the other and only the second one finishes it.
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute("""
-            SELECT player1_id, player2_id, problem_id, status, 
-                   player1_answer, player2_answer, player1_time, player2_time
-            FROM matches WHERE id = ?
-        """, (match_id,))
-        
+            UPDATE matches
+            SET player1_answer = CASE WHEN player1_id = :user_id THEN :answer ELSE player1_answer END,
+                player1_time = CASE WHEN player1_id = :user_id THEN :time_spent ELSE player1_time END,
+                player2_answer = CASE WHEN player2_id = :user_id THEN :answer ELSE player2_answer END,
+                player2_time = CASE WHEN player2_id = :user_id THEN :time_spent ELSE player2_time END
+            WHERE id = :match_id AND status = 'active'
+              AND ((player1_id = :user_id AND player1_answer IS NULL)
+                   OR (player2_id = :user_id AND player2_answer IS NULL))
+            RETURNING player1_id, player2_id, problem_id,
+                      player1_answer, player2_answer, player1_time, player2_time
+        """, {'user_id': user_id, 'answer': answer, 'time_spent': time_spent, 'match_id': match_id})
         match = cursor.fetchone()
         
         if not match:
+            conn.rollback()
+            error = self.match_answer_error(cursor, match_id, user_id)
             conn.close()
-            return {'success': False, 'error': 'Матч не найден'}
-        
-        if match[3] != 'active':
-            conn.close()
-            return {'success': False, 'error': 'Матч не активен'}
+            return {'success': False, 'error': error}
         
-        player1_id, player2_id, problem_id, status, p1_answer, p2_answer, p1_time, p2_time = match
+        player1_id, player2_id, problem_id, p1_answer, p2_answer, p1_time, p2_time = match
         
-        if user_id != player1_id and user_id != player2_id:
-            conn.close()
-            return {'success': False, 'error': 'Вы не участник этого матча'}
-        
-        is_player1 = user_id == player1_id
-
-        if is_player1 and p1_answer is not None:
-            conn.close()
-            return {'success': False, 'error': 'Вы уже ответили на вопрос.'}
-        if not is_player1 and p2_answer is not None:
+        if p1_answer is None or p2_answer is None:
+            conn.commit()
             conn.close()
-            return {'success': False, 'error': 'Вы уже ответили на вопрос.'}
+            return {'success': True, 'message': 'Ответ отправлен'}
         
-        answer_field = 'player1_answer' if is_player1 else 'player2_answer'
-        time_field = 'player1_time' if is_player1 else 'player2_time'
+        winner_id, p1_correct, p2_correct = judge_answers(
+            problem_id, player1_id, player2_id, p1_answer, p2_answer, p1_time, p2_time
+        )
+        new_ratings = finish_match(cursor, match_id, player1_id, player2_id, winner_id)
+        if winner_id:
+            self.check_achievements(cursor, winner_id)
+        conn.commit()
+        conn.close()
         
-        cursor.execute(f"""
-            UPDATE matches 
-            SET {answer_field} = ?, {time_field} = ?
-            WHERE id = ?
-        """, (answer, time_spent, match_id))
+        publish_match_finished(self.bus, match_id, player1_id, player2_id, new_ratings, {
+            'type': 'match_finished',
+            'match_id': match_id,
+            'winner_id': winner_id,
+            'player1_correct': p1_correct,
+            'player2_correct': p2_correct
+        })
         
-        conn.commit()
-
+        return {
+            'success': True,
+            'message': 'Матч завершен!',
+            'match_finished': True,
+            'player1_correct': p1_correct,
+            'player2_correct': p2_correct,
+            'winner_id': winner_id,
+            'new_rating1': new_ratings[0],
+            'new_rating2': new_ratings[1]
+        }
+    
+    def match_answer_error(self, cursor, match_id, user_id):
         cursor.execute("""
-            SELECT player1_answer, player2_answer, player1_time, player2_time
+            SELECT player1_id, player2_id, status, player1_answer, player2_answer
             FROM matches WHERE id = ?
         """, (match_id,))
-        updated_match_answers = cursor.fetchone()
-        p1_answer, p2_answer, p1_time, p2_time = updated_match_answers
-        
-        response = {'success': True, 'message': 'Ответ отправлен'}
-
-        if p1_answer is not None and p2_answer is not None:
-            cursor.execute("SELECT answer FROM problems WHERE id = ?", (problem_id,))
-            problem = cursor.fetchone()
-            correct_answer = problem[0].strip().lower() if problem else ''
-            
-            p1_correct = p1_answer.strip().lower() == correct_answer
-            p2_correct = p2_answer.strip().lower() == correct_answer
-            
-            winner_id = None
-            if p1_correct and not p2_correct:
-                winner_id = player1_id
-            elif p2_correct and not p1_correct:
-                winner_id = player2_id
-            elif p1_correct and p2_correct:
-                winner_id = player1_id if p1_time < p2_time else player2_id
-            
-            cursor.execute("""
-                UPDATE matches 
-                SET status = 'finished', winner_id = ?, finished_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (winner_id, match_id))
-            
-            cursor.execute("SELECT rating FROM users WHERE id IN (?, ?)", (player1_id, player2_id))
-            ratings = cursor.fetchall()
-            rating1 = ratings[0][0]
-            rating2 = ratings[1][0]
-            
-            K = 32
-            expected1 = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
-            expected2 = 1 - expected1
-            
-            if winner_id == player1_id:
-                score1, score2 = 1, 0
-            elif winner_id == player2_id:
-                score1, score2 = 0, 1
-            else:
-                score1, score2 = 0.5, 0.5
-            
-            new_rating1 = rating1 + K * (score1 - expected1)
-            new_rating2 = rating2 + K * (score2 - expected2)
-            
-            cursor.execute("UPDATE users SET rating = ? WHERE id = ?", (int(new_rating1), player1_id))
-            cursor.execute("UPDATE users SET rating = ? WHERE id = ?", (int(new_rating2), player2_id))
-            
-            if winner_id:
-                self.check_achievements(cursor, winner_id)
-
-            conn.commit()
-
-            response['match_finished'] = True
-            response['player1_correct'] = p1_correct
-            response['player2_correct'] = p2_correct
-            response['winner_id'] = winner_id
-            response['new_rating1'] = int(new_rating1)
-            response['new_rating2'] = int(new_rating2)
-            response['message'] = 'Матч завершен!'
-            
-            if self.ws_server:
-                self.ws_server.broadcast_to_match(match_id, {
-                    'type': 'match_finished',
-                    'match_id': match_id,
-                    'winner_id': winner_id,
-                    'player1_correct': p1_correct,
-                    'player2_correct': p2_correct
-                })
+        match = cursor.fetchone()
         
-        conn.close()
-        return response
+        if not match:
+            return 'Матч не найден'
+        if match[2] != 'active':
+            return 'Матч не активен'
+        if user_id != match[0] and user_id != match[1]:
+            return 'Вы не участник этого матча'
+        return 'Вы уже ответили на вопрос.'
     
     def import_problems(self, data):
         user_id = data.get('user_id')
         problems_data = data.get('problems', [])
         
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
@@ -1210,10 +1081,13 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         conn.commit()
         conn.close()
         
+        counters.increment('problems_count', imported)
+        problem_catalog.load()
+        
         return {'success': True, 'message': f'Импортировано задач: {imported}'}
     
     def export_problems(self):
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -1244,40 +1118,89 @@ class OlympiadHandler(http.server.BaseHTTPRequestHandler):
         self.wfile.write(json.dumps(problems, ensure_ascii=False, indent=2).encode('utf-8'))
     
     def send_api_response(self, data):
+        prerendered = isinstance(data, bytes)
+        if prerendered:
+            body = data
+        else:
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        
+        gzipped = should_gzip(body, self.headers.get('Accept-Encoding'))
+        is_get = self.command == 'GET'
+        if is_get:
+            etag = cached_etag(body) if prerendered else make_etag(body)
+            cache_control = cache_control_for(urlparse(self.path).path)
+            
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', gzip_etag(etag) if gzipped else etag)
+                self.send_header('Cache-Control', cache_control)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                return
+        
+        if gzipped:
+            body = cached_gzip(body) if prerendered else gzip_body(body)
+        
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if is_get:
+            self.send_header('ETag', gzip_etag(etag) if gzipped else etag)
+            self.send_header('Cache-Control', cache_control)
+        else:
+            self.send_header('Cache-Control', 'no-store')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
     
     def serve_static_file(self, path):
         if path == '/':
-            filename = INDEX_PATH
-        else:
-            filename = os.path.join(FRONTEND_DIR, path.lstrip('/'))
+            path = '/index.html'
         
-        if not os.path.exists(filename):
-            if filename.endswith(('.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.ico', '.svg')):
+        asset = static_assets.get(path)
+        if not asset:
+            if path.endswith(('.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.ico', '.svg')):
                 self.send_error(404)
                 return
-            else:
-                filename = INDEX_PATH
+            asset = static_assets.get('/index.html')
+            if not asset:
+                self.send_error(404)
+                return
+        
+        version = parse_qs(urlparse(self.path).query).get('v', [None])[0]
+        if version and version == asset.version:
+            cache_control = STATIC_IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = STATIC_DEFAULT_CACHE_CONTROL
         
-        content_type, _ = mimetypes.guess_type(filename)
-        if not content_type:
-            content_type = 'text/html'
+        gzipped = asset.gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding'))
+        etag = gzip_etag(asset.etag) if gzipped else asset.etag
         
-        try:
-            with open(filename, 'rb') as f:
-                content = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.send_header('Content-Length', str(len(content)))
+        if asset.not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', asset.last_modified)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            print(f"Error serving file {filename}: {e}")
-            self.send_error(500)
+            return
+        
+        content = asset.gzipped if gzipped else asset.content
+        
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,205 @@
+import functools
+import json
+import os
+import socket
+import threading
+import time
+
+from rooms import match_room
+
+_state = threading.local()
+
+
+class LocalBus:
+    # Delivers messages to subscribers in this process only. Used when HTTP
+    # and WebSocket serving share one process.
+    def __init__(self):
+        self.handlers = {}
+        self.remote_handlers = {}
+
+    def subscribe(self, topic, handler):
+        # handler gets every message on topic, published here or elsewhere
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def on_remote(self, topic, handler):
+        # handler gets only messages published by other processes
+        self.remote_handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic, message):
+        for handler in self.handlers.get(topic, ()):
+            try:
+                handler(message)
+            except Exception as e:
+                print(f"⚠️ Bus handler failed for {topic}: {e}")
+        self.forward(topic, message)
+
+    def forward(self, topic, message):
+        pass
+
+    def dispatch_remote(self, topic, message):
+        # Side effects of a remote message stay in this process
+        _state.remote = True
+        try:
+            for handler in self.remote_handlers.get(topic, []) + self.handlers.get(topic, []):
+                try:
+                    handler(message)
+                except Exception as e:
+                    print(f"⚠️ Bus handler failed for {topic}: {e}")
+        finally:
+            _state.remote = False
+
+    def broadcast_to_room(self, room, message):
+        self.publish('room', {'room': list(room), 'message': message})
+
+    def broadcast_to_match(self, match_id, message):
+        self.broadcast_to_room(match_room(match_id), message)
+
+    def notify_stats_changed(self, *user_ids):
+        self.publish('stats', {'user_ids': list(user_ids)})
+
+
+class UnixSocketBus(LocalBus):
+    # Connects to a BusBroker; messages are newline-delimited JSON.
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.sock = None
+        self.send_lock = threading.Lock()
+
+    def connect(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+                break
+            except OSError:
+                sock.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        self.sock = sock
+        threading.Thread(target=self.read_loop, args=(sock,), daemon=True).start()
+
+    def forward(self, topic, message):
+        sock = self.sock
+        if sock is None or getattr(_state, 'remote', False):
+            return
+        line = json.dumps({'topic': topic, 'message': message}).encode('utf-8') + b'\n'
+        try:
+            with self.send_lock:
+                sock.sendall(line)
+        except OSError as e:
+            # The caller's work is already committed; only replication is lost
+            print(f"⚠️ Broadcast bus send failed: {e}")
+            self.disconnect(sock)
+
+    def read_loop(self, sock):
+        try:
+            for line in sock.makefile('rb'):
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                self.dispatch_remote(data['topic'], data['message'])
+        except OSError:
+            pass
+        print("⚠️ Broadcast bus connection closed")
+        self.disconnect(sock)
+
+    def disconnect(self, sock):
+        # Drops a broken connection once and reconnects in the background
+        with self.send_lock:
+            if self.sock is not sock:
+                return
+            self.sock = None
+        sock.close()
+        threading.Thread(target=self.reconnect, daemon=True).start()
+
+    def reconnect(self):
+        while True:
+            try:
+                self.connect()
+                break
+            except OSError:
+                pass
+        print("🔌 Broadcast bus reconnected")
+        # Messages sent while disconnected are lost; let the caches reload
+        self.dispatch_remote('reconnected', {})
+
+
+class BusBroker:
+    # Relays every line a process sends to all the other connected processes
+    def __init__(self, path):
+        self.path = path
+        self.peers = {}
+        self.lock = threading.Lock()
+
+    def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(64)
+        while True:
+            conn, _ = server.accept()
+            with self.lock:
+                self.peers[conn] = threading.Lock()
+            threading.Thread(target=self.relay, args=(conn,), daemon=True).start()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve, daemon=True)
+        thread.start()
+        return thread
+
+    def relay(self, conn):
+        try:
+            for line in conn.makefile('rb'):
+                with self.lock:
+                    peers = [(peer, lock) for peer, lock in self.peers.items() if peer is not conn]
+                for peer, lock in peers:
+                    try:
+                        with lock:
+                            peer.sendall(line)
+                    except OSError:
+                        pass
+        finally:
+            with self.lock:
+                self.peers.pop(conn, None)
+            conn.close()
+
+
+bus = LocalBus()
+
+
+def install(new_bus):
+    global bus
+    bus = new_bus
+
+
+def replicated(name):
+    # Cache mutations decorated with this are replayed by the other processes,
+    # which apply them to their own copy of the cache named `name`. Only the
+    # outermost call is sent, so methods calling each other replicate once.
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            depth = getattr(_state, 'depth', 0)
+            _state.depth = depth + 1
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                _state.depth = depth
+            if depth == 0:
+                bus.forward('cache', {'target': name, 'method': method.__name__, 'args': args, 'kwargs': kwargs})
+            return result
+        return wrapper
+    return decorator
+
+
+def apply_cache_events(replicas):
+    def handler(message):
+        target = replicas.get(message['target'])
+        if target is not None:
+            getattr(target, message['method'])(*message['args'], **message['kwargs'])
+    return handler
@@ -6,3 +6,156 @@ DB_FILE = "olympiad_platform.db"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "frontend")
 INDEX_PATH = os.path.join(FRONTEND_DIR, "index.html")
+
+# HTTP serving: "threaded" uses a bounded worker pool, "single" serves one request at a time
+HTTP_SERVER_MODE = "threaded"
+HTTP_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+HTTP_BACKLOG = 128
+HTTP_REQUEST_TIMEOUT = 30
+
+# Process layout. With more than one process of either kind, HTTP and WebSocket
+# servers run in separate processes sharing their ports (SO_REUSEPORT) and
+# exchange broadcasts and cache updates through a broker on BUS_SOCKET.
+HTTP_PROCESSES = 1
+WS_PROCESSES = 1
+BUS_SOCKET = os.path.join(SCRIPT_DIR, "olympiad-bus.sock")
+
+# SQLite connection pool shared by HTTP handlers and the WebSocket server
+DB_POOL_SIZE = HTTP_MAX_WORKERS + 4
+DB_POOL_TIMEOUT = 10
+DB_STATEMENT_CACHE_SIZE = 256
+
+# SQLite storage profile, applied at startup and to every new connection
+DB_JOURNAL_MODE = "WAL"
+DB_SYNCHRONOUS = "NORMAL"
+DB_BUSY_TIMEOUT_MS = 5000
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_CACHE_SIZE_KB = 64 * 1024
+DB_TEMP_STORE = "MEMORY"
+DB_CHECKPOINT_INTERVAL = 60
+
+# In-memory platform counters are recomputed from the database this often (seconds)
+COUNTERS_RECONCILE_INTERVAL = 300
+
+# Ratings reach the in-memory leaderboard after each commit, so concurrent
+# solutions and matches can apply them out of order; it is rebuilt from
+# users.rating this often (seconds)
+LEADERBOARD_RECONCILE_INTERVAL = 300
+
+# User profiles (username, rating, role) cached for WebSocket sessions
+USER_CACHE_TTL = 300
+USER_CACHE_SIZE = 10000
+
+# JSON/static responses at least this large are gzip-compressed when the client accepts it
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+
+# Cache-Control for GET API responses, matched by path prefix (longest first)
+API_CACHE_CONTROL = {
+    '/api/achievements': 'public, max-age=3600',
+    '/api/problems': 'no-cache',
+    '/api/problem/': 'no-cache',
+    '/api/leaderboard': 'no-cache',
+    '/api/stats': 'max-age=2',
+    '/api/user/': 'private, no-cache',
+    '/api/user_achievements/': 'private, no-cache',
+}
+API_DEFAULT_CACHE_CONTROL = 'no-cache'
+
+# Frontend files are served from memory; changes on disk are picked up within this many seconds (0 disables)
+STATIC_RELOAD_INTERVAL = 2
+STATIC_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+STATIC_DEFAULT_CACHE_CONTROL = 'no-cache'
+
+# Components inlined into index.html when it is served, keyed by placeholder element id
+BUNDLE_COMPONENTS = True
+FRONTEND_COMPONENTS = {
+    'header-component': 'components/header.html',
+    'nav-tabs-component': 'components/nav_tabs.html',
+    'auth-panel-component': 'components/auth.html',
+    'problems-panel-component': 'components/problems.html',
+    'pvp-panel-component': 'components/pvp.html',
+    'stats-panel-component': 'components/stats.html',
+    'leaderboard-panel-component': 'components/leaderboard.html',
+    'profile-panel-component': 'components/profile.html',
+    'admin-panel-component': 'components/admin.html',
+    'modal-overlay-component': 'components/modals.html',
+}
+
+# Matchmaking queue: players are paired when their ratings differ by at most
+# BASE_WINDOW + WINDOW_GROWTH per second waited (capped at MAX_WINDOW).
+# Players still waiting after MATCHMAKING_MAX_WAIT seconds are dropped.
+MATCHMAKING_BASE_WINDOW = 100
+MATCHMAKING_WINDOW_GROWTH = 20
+MATCHMAKING_MAX_WINDOW = 800
+MATCHMAKING_MAX_WAIT = 120
+MATCHMAKING_SWEEP_INTERVAL = 1
+
+# Match problems are drawn at difficulty 1 below the first rating, 2 below the
+# second and 3 above it, avoiding the last MATCH_PROBLEM_HISTORY problems each
+# player got in a match
+MATCH_DIFFICULTY_RATINGS = (1100, 1300)
+MATCH_PROBLEM_HISTORY = 20
+
+# Rating points for a correct solution, per difficulty level
+SOLUTION_RATING_PER_DIFFICULTY = 10
+
+# Elo K-factor for rating changes after a PvP match
+MATCH_RATING_K = 32
+
+# Every MATCH_EXPIRY_INTERVAL seconds, matches still waiting for an opponent
+# MATCH_WAITING_TTL seconds after creation are cancelled, and matches still
+# active MATCH_ACTIVE_TTL seconds after they started are settled: a player
+# who answered correctly wins by forfeit, otherwise it is a draw. Active
+# matches nobody answered are cancelled like waiting ones and stay unrated.
+MATCH_WAITING_TTL = 15 * 60
+MATCH_ACTIVE_TTL = 30 * 60
+MATCH_EXPIRY_INTERVAL = 60
+
+# WebSocket server: all connections are served by WS_LOOPS selector loops
+WS_HOST = "localhost"
+WS_PORT = 8765
+WS_BACKLOG = 1024
+WS_MAX_CONNECTIONS = 10000
+WS_LOOPS = 1
+WS_MAX_FRAME_SIZE = 1024 * 1024
+WS_MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+# Per-connection outbound queue. On overflow "drop" disconnects the client,
+# "coalesce" discards its oldest queued messages to make room for new ones.
+WS_MAX_QUEUED_MESSAGES = 256
+WS_MAX_QUEUED_BYTES = 1024 * 1024
+WS_OVERFLOW_POLICY = "drop"
+
+# Heartbeats: every WS_REAP_INTERVAL seconds each loop pings connections that
+# were silent for WS_PING_INTERVAL and evicts those silent for WS_IDLE_TIMEOUT
+# (or still without a handshake after WS_HANDSHAKE_TIMEOUT).
+WS_PING_INTERVAL = 20
+WS_IDLE_TIMEOUT = 60
+WS_HANDSHAKE_TIMEOUT = 10
+WS_REAP_INTERVAL = 5
+
+# Inbound messages per connection: WS_RATE_LIMIT per second, bursts up to WS_RATE_BURST
+WS_RATE_LIMIT = 5
+WS_RATE_BURST = 20
+
+# Outbound events for one client produced within WS_BATCH_WINDOW seconds are
+# sent together as one JSON array frame (at most WS_BATCH_MAX_MESSAGES events).
+WS_BATCH_WINDOW = 0.02
+WS_BATCH_MAX_MESSAGES = 64
+
+# Threads resolving user profiles for 'auth' messages, so a cache miss never
+# blocks an event loop on the database
+WS_AUTH_WORKERS = 4
+
+# Subscribers of the 'stats' channel get changes batched over this many seconds
+WS_STATS_DEBOUNCE = 1.0
+
+# permessage-deflate (RFC 7692). Messages shorter than WS_DEFLATE_MIN_SIZE are
+# sent uncompressed. Without context takeover a broadcast is compressed once
+# and the same frame is shared by every recipient.
+WS_DEFLATE_ENABLED = True
+WS_DEFLATE_WINDOW_BITS = 15
+WS_DEFLATE_CONTEXT_TAKEOVER = False
+WS_DEFLATE_MIN_SIZE = 256
+WS_DEFLATE_LEVEL = 6
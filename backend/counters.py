@@ -0,0 +1,65 @@
+import threading
+
+from config import COUNTERS_RECONCILE_INTERVAL
+from db_pool import get_connection
+from broadcast_bus import replicated
+from periodic import start_periodic
+
+COUNTER_QUERIES = {
+    'users_count': "SELECT COUNT(*) FROM users",
+    'problems_count': "SELECT COUNT(*) FROM problems",
+    'correct_solutions': "SELECT COUNT(*) FROM solutions WHERE is_correct = 1",
+    'matches_played': "SELECT COUNT(*) FROM matches WHERE status = 'finished'"
+}
+
+
+class PlatformCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: 0 for name in COUNTER_QUERIES}
+        self.listeners = []
+
+    @replicated('counters')
+    def load(self):
+        self.refresh()
+
+    def refresh(self):
+        # Re-reads the counters of this process only
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        values = {}
+        for name, query in COUNTER_QUERIES.items():
+            cursor.execute(query)
+            values[name] = cursor.fetchone()[0]
+        
+        conn.close()
+        
+        with self.lock:
+            changed = values != self.values
+            self.values = values
+        if changed:
+            self.notify()
+
+    @replicated('counters')
+    def increment(self, name, delta=1):
+        with self.lock:
+            self.values[name] += delta
+        self.notify()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def notify(self):
+        for callback in self.listeners:
+            callback()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def start_reconcile_task(self, interval=COUNTERS_RECONCILE_INTERVAL):
+        return start_periodic(self.refresh, interval, "Counters reconcile")
+
+
+counters = PlatformCounters()
@@ -1,6 +1,11 @@
 import sqlite3
 import hashlib
-from config import DB_FILE
+import threading
+import time
+from config import (
+    DB_FILE, DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT_MS, DB_MMAP_SIZE,
+    DB_CACHE_SIZE_KB, DB_TEMP_STORE, DB_CHECKPOINT_INTERVAL
+)
 
 try:
     import bcrypt
@@ -21,9 +26,33 @@ def verify_password(password, hashed):
     else:
         return hashlib.sha256(password.encode()).hexdigest() == hashed
 
-def migrate_database(conn):
+def apply_pragmas(conn):
     cursor = conn.cursor()
-    
+    cursor.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size = {-int(DB_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA temp_store = {DB_TEMP_STORE}")
+    cursor.close()
+
+def checkpoint_loop(interval):
+    conn = sqlite3.connect(DB_FILE)
+    apply_pragmas(conn)
+    while True:
+        time.sleep(interval)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except sqlite3.Error as e:
+            print(f"⚠️ WAL checkpoint failed: {e}")
+
+def start_checkpoint_task(interval=DB_CHECKPOINT_INTERVAL):
+    if DB_JOURNAL_MODE.upper() != 'WAL' or not interval:
+        return None
+    thread = threading.Thread(target=checkpoint_loop, args=(interval,), daemon=True)
+    thread.start()
+    return thread
+
+def migration_add_user_progress(cursor):
     cursor.execute("PRAGMA table_info(users)")
     columns = [col[1] for col in cursor.fetchall()]
     
@@ -32,11 +61,47 @@ def migrate_database(conn):
     
     if 'level' not in columns:
         cursor.execute("ALTER TABLE users ADD COLUMN level INTEGER DEFAULT 1")
+
+def migration_add_hot_indexes(cursor):
+    # get_user_stats, check_achievements, admin_delete_user
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_solutions_user
+        ON solutions (user_id, problem_id, is_correct, time_spent)
+    """)
+    # delete_problem
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_solutions_problem ON solutions (problem_id)")
+    # get_active_matches
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_status ON matches (status, started_at)")
+    # check_achievements
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_winner ON matches (winner_id, status)")
+    # get_user_stats pvp block, admin_delete_user
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_player1 ON matches (player1_id, status, winner_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_matches_player2 ON matches (player2_id, status, winner_id)")
+    # get_users, get_leaderboard
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating DESC)")
+
+# Applied in order; PRAGMA user_version stores how many have run.
+# Append new migrations, never reorder or edit released ones.
+MIGRATIONS = [
+    migration_add_user_progress,
+    migration_add_hot_indexes,
+]
+
+def migrate_database(conn):
+    cursor = conn.cursor()
     
-    conn.commit()
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(cursor)
+        cursor.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
 
 def init_database():
     conn = sqlite3.connect(DB_FILE)
+    conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    apply_pragmas(conn)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -54,8 +119,6 @@ def init_database():
     )
     ''')
     
-    migrate_database(conn)
-    
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS problems (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -142,6 +205,8 @@ def init_database():
     )
     ''')
     
+    migrate_database(conn)
+    
     cursor.execute("SELECT COUNT(*) FROM users WHERE username='admin'")
     if cursor.fetchone()[0] == 0:
         admin_pass = hash_password("admin123456")
@@ -197,4 +262,5 @@ def init_database():
         )
     
     conn.commit()
+    conn.execute("PRAGMA optimize")
     conn.close()
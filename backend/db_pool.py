@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from config import DB_FILE, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_STATEMENT_CACHE_SIZE
+from database import apply_pragmas
+
+
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    def __init__(self, database=DB_FILE, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = deque()
+        self.size = 0
+        self.cond = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def create_connection(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        apply_pragmas(conn)
+        return conn
+
+    def connect(self):
+        with self.cond:
+            self.checkouts += 1
+            if not self.idle and self.size >= self.max_size:
+                self.waits += 1
+                started = time.monotonic()
+                ready = self.cond.wait_for(lambda: self.idle or self.size < self.max_size, self.timeout)
+                self.wait_time += time.monotonic() - started
+                if not ready:
+                    self.timeouts += 1
+                    raise sqlite3.OperationalError("database connection pool exhausted")
+
+            if self.idle:
+                return PooledConnection(self, self.idle.pop())
+            self.size += 1
+
+        try:
+            conn = self.create_connection()
+        except Exception:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            return
+
+        with self.cond:
+            self.idle.append(conn)
+            self.cond.notify()
+
+    def close_all(self):
+        with self.cond:
+            while self.idle:
+                self.idle.pop().close()
+                self.size -= 1
+
+    def metrics(self):
+        with self.cond:
+            return {
+                'size': self.size,
+                'max_size': self.max_size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 3),
+                'timeouts': self.timeouts
+            }
+
+
+pool = ConnectionPool()
+
+
+def get_connection():
+    return pool.connect()
@@ -0,0 +1,56 @@
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import HTTP_SERVER_MODE, HTTP_MAX_WORKERS, HTTP_BACKLOG
+
+
+class SingleHTTPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    request_queue_size = HTTP_BACKLOG
+
+    def __init__(self, server_address, handler_class, reuse_port=False):
+        self.allow_reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    request_queue_size = HTTP_BACKLOG
+
+    def __init__(self, server_address, handler_class, max_workers=HTTP_MAX_WORKERS, reuse_port=False):
+        # reuse_port lets several processes accept on the same port
+        self.allow_reuse_port = reuse_port
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        # Requests accepted but not finished yet. When every slot is taken we stop
+        # calling accept(), so new connections wait in the kernel backlog instead of memory.
+        self.slots = threading.BoundedSemaphore(max_workers * 2)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_http_server(server_address, handler_class, reuse_port=False):
+    if HTTP_SERVER_MODE == 'single':
+        return SingleHTTPServer(server_address, handler_class, reuse_port=reuse_port)
+    return ThreadPoolHTTPServer(server_address, handler_class, reuse_port=reuse_port)
@@ -0,0 +1,64 @@
+import gzip
+import hashlib
+from functools import lru_cache
+
+from config import GZIP_MIN_SIZE, GZIP_LEVEL
+
+
+def make_etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def gzip_etag(etag):
+    # The gzip representation needs its own validator, so "abc" becomes "abc-gz"
+    return etag[:-1] + '-gz"'
+
+
+def etag_matches(if_none_match, etag):
+    # etag is the identity validator; its gzip form matches too
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag or candidate == gzip_etag(etag):
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding):
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def should_gzip(body, accept_encoding):
+    return len(body) >= GZIP_MIN_SIZE and accepts_gzip(accept_encoding)
+
+
+def gzip_body(body):
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Pre-rendered bodies (problem catalog) are long-lived bytes objects, so their
+# validator and compressed form are computed once and reused across requests.
+@lru_cache(maxsize=256)
+def cached_etag(body):
+    return make_etag(body)
+
+
+@lru_cache(maxsize=256)
+def cached_gzip(body):
+    return gzip_body(body)
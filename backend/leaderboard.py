@@ -0,0 +1,153 @@
+import bisect
+import threading
+
+from config import LEADERBOARD_RECONCILE_INTERVAL
+from db_pool import get_connection
+from broadcast_bus import replicated
+from periodic import start_periodic
+
+
+class Leaderboard:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        # (-rating, user_id) kept sorted, so rank lookups are a binary search
+        self.order = []
+
+    @replicated('leaderboard')
+    def load(self):
+        self.refresh()
+
+    def refresh(self):
+        # Re-reads the leaderboard of this process only
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT u.id, u.username, u.rating, u.level,
+                   COUNT(s.id) as solved,
+                   SUM(CASE WHEN s.is_correct THEN 1 ELSE 0 END) as correct
+            FROM users u
+            LEFT JOIN solutions s ON u.id = s.user_id
+            GROUP BY u.id
+        """)
+
+        entries = {}
+        for row in cursor.fetchall():
+            entries[row[0]] = {
+                'id': row[0],
+                'username': row[1],
+                'rating': row[2] or 0,
+                'level': row[3],
+                'solved': row[4] or 0,
+                'correct': row[5] or 0
+            }
+
+        conn.close()
+
+        with self.lock:
+            self.entries = entries
+            self.order = sorted((-entry['rating'], user_id) for user_id, entry in entries.items())
+
+    @replicated('leaderboard')
+    def add_user(self, user_id, username, rating=1000, level=1):
+        with self.lock:
+            self.remove_user(user_id)
+            self.entries[user_id] = {
+                'id': user_id,
+                'username': username,
+                'rating': rating,
+                'level': level,
+                'solved': 0,
+                'correct': 0
+            }
+            bisect.insort(self.order, (-rating, user_id))
+
+    @replicated('leaderboard')
+    def remove_user(self, user_id):
+        with self.lock:
+            entry = self.entries.pop(user_id, None)
+            if entry:
+                index = bisect.bisect_left(self.order, (-entry['rating'], user_id))
+                del self.order[index]
+
+    @replicated('leaderboard')
+    def set_rating(self, user_id, rating):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if not entry or entry['rating'] == rating:
+                return
+            index = bisect.bisect_left(self.order, (-entry['rating'], user_id))
+            del self.order[index]
+            entry['rating'] = rating
+            bisect.insort(self.order, (-rating, user_id))
+
+    @replicated('leaderboard')
+    def record_solution(self, user_id, is_correct, rating=None, level=None):
+        # rating is the committed value, not a delta, so updates applied out of order cannot accumulate errors
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if not entry:
+                return
+            entry['solved'] += 1
+            if is_correct:
+                entry['correct'] += 1
+            if level is not None:
+                entry['level'] = level
+            if rating is not None:
+                self.set_rating(user_id, rating)
+
+    def rating(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            return entry['rating'] if entry else None
+
+    def format_entry(self, rank, entry):
+        total = entry['solved']
+        correct = entry['correct']
+        return {
+            'rank': rank,
+            'id': entry['id'],
+            'username': entry['username'],
+            'rating': entry['rating'],
+            'level': entry['level'],
+            'solved': total,
+            'correct': correct,
+            'accuracy': round((correct/total*100), 2) if total > 0 else 0
+        }
+
+    def top(self, limit=50):
+        with self.lock:
+            return [
+                self.format_entry(rank, self.entries[user_id])
+                for rank, (_, user_id) in enumerate(self.order[:limit], start=1)
+            ]
+
+    def rank(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if not entry:
+                return None
+            return bisect.bisect_left(self.order, (-entry['rating'], user_id)) + 1
+
+    def around(self, user_id, radius=5):
+        with self.lock:
+            rank = self.rank(user_id)
+            if rank is None:
+                return []
+            start = max(0, rank - 1 - radius)
+            window = self.order[start:rank + radius]
+            return [
+                self.format_entry(position, self.entries[entry_id])
+                for position, (_, entry_id) in enumerate(window, start=start + 1)
+            ]
+
+    def size(self):
+        with self.lock:
+            return len(self.order)
+
+    def start_reconcile_task(self, interval=LEADERBOARD_RECONCILE_INTERVAL):
+        return start_periodic(self.refresh, interval, "Leaderboard reconcile")
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,99 @@
+import threading
+
+from db_pool import get_connection
+from broadcast_bus import replicated
+
+WAITING_PLAYER = 'Ожидание...'
+NO_PROBLEM = 'Не выбрана'
+
+
+class MatchLobby:
+    # Waiting and active matches, kept in memory so the lobby never has to
+    # query the database. Every change is reported to the listeners as a
+    # lobby message that can be sent to clients as is.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.matches = {}
+        self.listeners = []
+
+    @replicated('lobby')
+    def load(self):
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT m.id, m.status, m.started_at,
+                   p1.username as player1,
+                   p2.username as player2,
+                   p.title as problem_title
+            FROM matches m
+            JOIN users p1 ON m.player1_id = p1.id
+            LEFT JOIN users p2 ON m.player2_id = p2.id
+            LEFT JOIN problems p ON m.problem_id = p.id
+            WHERE m.status IN ('waiting', 'active')
+        """)
+
+        matches = {}
+        for row in cursor.fetchall():
+            matches[row[0]] = {
+                'id': row[0],
+                'status': row[1],
+                'started_at': row[2],
+                'player1': row[3],
+                'player2': row[4] or WAITING_PLAYER,
+                'problem': row[5] or NO_PROBLEM
+            }
+
+        conn.close()
+
+        with self.lock:
+            self.matches = matches
+        self.notify({'type': 'lobby', 'event': 'snapshot', 'matches': self.list()})
+
+    @replicated('lobby')
+    def match_created(self, match_id, started_at, player1, problem, player2=None):
+        match = {
+            'id': match_id,
+            'status': 'active' if player2 else 'waiting',
+            'started_at': started_at,
+            'player1': player1,
+            'player2': player2 or WAITING_PLAYER,
+            'problem': problem or NO_PROBLEM
+        }
+        with self.lock:
+            # A join that overtook this event already added the active match
+            if match_id in self.matches:
+                return
+            self.matches[match_id] = match
+        self.notify({'type': 'lobby', 'event': 'match_created', 'match': match})
+
+    @replicated('lobby')
+    def match_joined(self, match_id, started_at, player2, player1=None, problem=None):
+        # Adds the match when the join arrives before match_created
+        with self.lock:
+            current = self.matches.get(match_id) or {'id': match_id, 'player1': player1, 'problem': problem or NO_PROBLEM}
+            match = dict(current, status='active', started_at=started_at, player2=player2 or WAITING_PLAYER)
+            self.matches[match_id] = match
+        self.notify({'type': 'lobby', 'event': 'match_joined', 'match': match})
+
+    @replicated('lobby')
+    def match_finished(self, match_id):
+        with self.lock:
+            if self.matches.pop(match_id, None) is None:
+                return
+        self.notify({'type': 'lobby', 'event': 'match_finished', 'match_id': match_id})
+
+    def list(self, limit=20):
+        with self.lock:
+            matches = sorted(self.matches.values(), key=lambda match: (match['started_at'] or '', match['id']), reverse=True)
+        return matches[:limit]
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def notify(self, message):
+        for callback in self.listeners:
+            callback(message)
+
+
+lobby = MatchLobby()
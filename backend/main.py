@@ -1,43 +1,150 @@
-import socketserver
 import threading
+import multiprocessing
 import os
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import PORT, DB_FILE, FRONTEND_DIR, INDEX_PATH
-from database import init_database
+from config import (
+    PORT, DB_FILE, FRONTEND_DIR, INDEX_PATH, HTTP_SERVER_MODE, HTTP_MAX_WORKERS,
+    HTTP_PROCESSES, WS_PROCESSES, BUS_SOCKET
+)
+from database import init_database, start_checkpoint_task
 from api_handlers import OlympiadHandler
 from websocket_server import WebSocketServer
+from http_server import create_http_server
+from leaderboard import leaderboard
+from counters import counters
+from problem_catalog import problem_catalog
+from static_assets import static_assets
+from lobby import lobby
+from matchmaking import matchmaker
+from match_expiry import match_expiry
+from problem_sampler import problem_sampler
+from user_cache import user_profiles
+import broadcast_bus
+from broadcast_bus import LocalBus, UnixSocketBus, BusBroker, apply_cache_events
+
+REPLICAS = {
+    'leaderboard': leaderboard,
+    'counters': counters,
+    'problem_catalog': problem_catalog,
+    'lobby': lobby,
+    'user_profiles': user_profiles,
+    'problem_sampler': problem_sampler
+}
+
+def load_caches():
+    leaderboard.load()
+    counters.load()
+    problem_catalog.load()
+    lobby.load()
+    static_assets.load()
+    counters.start_reconcile_task()
+    leaderboard.start_reconcile_task()
+    matchmaker.start_sweeper()
+    match_expiry.start_expiry_task()
+
+def connect_bus(caches):
+    # caches are reloaded after a reconnect, since the events missed meanwhile are lost
+    def reload_caches(message):
+        for cache in caches:
+            cache.load()
+
+    bus = UnixSocketBus(BUS_SOCKET)
+    broadcast_bus.install(bus)
+    bus.on_remote('cache', apply_cache_events(REPLICAS))
+    bus.on_remote('reconnected', reload_caches)
+    bus.connect()
+    return bus
+
+def create_ws_server(bus, reuse_port=False):
+    ws_server = WebSocketServer(bus=bus, reuse_port=reuse_port)
+    counters.add_listener(ws_server.notify_stats_changed)
+    lobby.add_listener(ws_server.publish_lobby_event)
+    return ws_server
+
+def print_banner():
+    print(f"🚀 HTTP server running on http://localhost:{PORT}")
+    if HTTP_SERVER_MODE == 'single':
+        print("🧵 Serving mode: single-threaded")
+    else:
+        print(f"🧵 Serving mode: thread pool ({HTTP_MAX_WORKERS} workers)")
+    if HTTP_PROCESSES > 1 or WS_PROCESSES > 1:
+        print(f"🧩 Processes: {HTTP_PROCESSES} HTTP, {WS_PROCESSES} WebSocket")
+    print(f"🌐 Open browser: http://localhost:{PORT}")
+    print(f"👑 Admin: admin / admin123")
+    print(f"👤 Test user: test / test123")
+    print(f"📊 Database: {DB_FILE}")
+    print(f"📁 Frontend directory: {FRONTEND_DIR}")
+    if not os.path.exists(INDEX_PATH):
+        print(f"⚠️ File {INDEX_PATH} not found!")
+    print("⚡ Press Ctrl+C to stop server\n")
+
+def serve_http(bus, ws_server=None, reuse_port=False):
+    httpd_server = create_http_server(
+        ("", PORT), 
+        lambda *args, **kwargs: OlympiadHandler(*args, ws_server_instance=ws_server, bus=bus, **kwargs),
+        reuse_port=reuse_port
+    )
+    with httpd_server as httpd:
+        httpd.serve_forever()
+
+def run_http_process():
+    # Connect first so no cache event sent while loading is missed
+    bus = connect_bus([leaderboard, counters, problem_catalog, lobby])
+    load_caches()
+    try:
+        serve_http(bus, reuse_port=True)
+    except KeyboardInterrupt:
+        pass
+
+def run_ws_process():
+    bus = connect_bus([counters, lobby])
+    counters.load()
+    lobby.load()
+    counters.start_reconcile_task()
+    try:
+        create_ws_server(bus, reuse_port=True).start()
+    except KeyboardInterrupt:
+        pass
+
+def start_processes():
+    # The parent only checkpoints the database and relays bus messages
+    BusBroker(BUS_SOCKET).start()
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_http_process, daemon=True) for _ in range(HTTP_PROCESSES)]
+    processes += [context.Process(target=run_ws_process, daemon=True) for _ in range(WS_PROCESSES)]
+    for process in processes:
+        process.start()
+
+    print_banner()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped")
 
 def start_servers():
     init_database()
+    start_checkpoint_task()
+    if HTTP_PROCESSES > 1 or WS_PROCESSES > 1:
+        start_processes()
+        return
+
+    load_caches()
     
-    ws_server = WebSocketServer()
+    bus = LocalBus()
+    broadcast_bus.install(bus)
+    ws_server = create_ws_server(bus)
     ws_thread = threading.Thread(target=ws_server.start, daemon=True)
     ws_thread.start()
     
-    httpd_server = socketserver.TCPServer(
-        ("", PORT), 
-        lambda *args, **kwargs: OlympiadHandler(*args, ws_server_instance=ws_server, **kwargs)
-    )
-    
-    with httpd_server as httpd:
-        print(f"🚀 HTTP server running on http://localhost:{PORT}")
-        print(f"🌐 Open browser: http://localhost:{PORT}")
-        print(f"👑 Admin: admin / admin123")
-        print(f"👤 Test user: test / test123")
-        print(f"📊 Database: {DB_FILE}")
-        print(f"📁 Frontend directory: {FRONTEND_DIR}")
-        if not os.path.exists(INDEX_PATH):
-            print(f"⚠️ File {INDEX_PATH} not found!")
-        print("⚡ Press Ctrl+C to stop server\n")
-        
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n🛑 Server stopped")
-            httpd.server_close()
+    print_banner()
+    try:
+        serve_http(bus, ws_server)
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped")
 
 if __name__ == "__main__":
     start_servers()
@@ -0,0 +1,96 @@
+import time
+
+import broadcast_bus
+from config import MATCH_WAITING_TTL, MATCH_ACTIVE_TTL, MATCH_EXPIRY_INTERVAL
+from db_pool import get_connection
+from lobby import lobby
+from match_results import is_correct_answer, judge_answers, update_ratings, publish_match_finished
+from periodic import start_periodic
+
+
+class MatchExpiry:
+    # Cancels and settles abandoned matches in bulk. Every statement is
+    # conditional on the match status, so several HTTP processes can run
+    # this at once and each match is still expired exactly once.
+    def __init__(self):
+        self.cancelled = 0
+        self.settled = 0
+        self.last_run = None
+
+    def expire(self):
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            UPDATE matches
+            SET status = 'expired', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'waiting' AND started_at < datetime('now', ?)
+            RETURNING id
+        """, (f'-{int(MATCH_WAITING_TTL)} seconds',))
+        cancelled = [row[0] for row in cursor.fetchall()]
+
+        # Nobody answered: the match was never played, so it is not rated or counted
+        cursor.execute("""
+            UPDATE matches
+            SET status = 'expired', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'active' AND started_at < datetime('now', ?)
+              AND player1_answer IS NULL AND player2_answer IS NULL
+            RETURNING id
+        """, (f'-{int(MATCH_ACTIVE_TTL)} seconds',))
+        cancelled += [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("""
+            UPDATE matches
+            SET status = 'finished', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'active' AND started_at < datetime('now', ?)
+            RETURNING id, player1_id, player2_id, problem_id,
+                      player1_answer, player2_answer, player1_time, player2_time
+        """, (f'-{int(MATCH_ACTIVE_TTL)} seconds',))
+        expired = cursor.fetchall()
+
+        settled = []
+        for match_id, player1_id, player2_id, problem_id, p1_answer, p2_answer, p1_time, p2_time in expired:
+            if p1_answer is not None and p2_answer is not None:
+                # Both answered but the match was never finished; judge it normally
+                winner_id = judge_answers(problem_id, player1_id, player2_id, p1_answer, p2_answer, p1_time, p2_time)[0]
+                forfeit = False
+            else:
+                # A lone answer wins by forfeit only when it is correct; otherwise a draw
+                answered_id, answer = (player1_id, p1_answer) if p2_answer is None else (player2_id, p2_answer)
+                winner_id = answered_id if is_correct_answer(problem_id, answer) else None
+                forfeit = winner_id is not None
+            if winner_id:
+                cursor.execute("UPDATE matches SET winner_id = ? WHERE id = ?", (winner_id, match_id))
+            new_ratings = update_ratings(cursor, player1_id, player2_id, winner_id)
+            settled.append((match_id, player1_id, player2_id, winner_id, forfeit, new_ratings))
+
+        conn.commit()
+        conn.close()
+
+        bus = broadcast_bus.bus
+        for match_id in cancelled:
+            lobby.match_finished(match_id)
+            bus.broadcast_to_match(match_id, {'type': 'match_expired', 'match_id': match_id})
+        for match_id, player1_id, player2_id, winner_id, forfeit, new_ratings in settled:
+            publish_match_finished(bus, match_id, player1_id, player2_id, new_ratings, {
+                'type': 'match_finished',
+                'match_id': match_id,
+                'winner_id': winner_id,
+                'expired': True,
+                'forfeit': forfeit
+            })
+
+        self.cancelled += len(cancelled)
+        self.settled += len(settled)
+        self.last_run = time.time()
+        return len(cancelled), len(settled)
+
+    def start_expiry_task(self, interval=MATCH_EXPIRY_INTERVAL):
+        return start_periodic(self.expire, interval, "Match expiry")
+
+    def stats(self):
+        return {'cancelled': self.cancelled, 'settled': self.settled, 'last_run': self.last_run}
+
+
+match_expiry = MatchExpiry()
@@ -0,0 +1,80 @@
+from config import MATCH_RATING_K
+from counters import counters
+from leaderboard import leaderboard
+from lobby import lobby
+from problem_catalog import problem_catalog
+from user_cache import user_profiles
+
+
+def is_correct_answer(problem_id, answer):
+    problem = problem_catalog.get(problem_id)
+    correct_answer = str(problem['answer']).strip().lower() if problem else ''
+    return answer.strip().lower() == correct_answer
+
+
+def judge_answers(problem_id, player1_id, player2_id, p1_answer, p2_answer, p1_time, p2_time):
+    # Returns (winner_id, player1_correct, player2_correct); both correct goes to the faster one
+    p1_correct = is_correct_answer(problem_id, p1_answer)
+    p2_correct = is_correct_answer(problem_id, p2_answer)
+
+    winner_id = None
+    if p1_correct and not p2_correct:
+        winner_id = player1_id
+    elif p2_correct and not p1_correct:
+        winner_id = player2_id
+    elif p1_correct and p2_correct:
+        winner_id = player1_id if p1_time < p2_time else player2_id
+    return winner_id, p1_correct, p2_correct
+
+
+def elo_ratings(rating1, rating2, score1, k=MATCH_RATING_K):
+    expected1 = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+    change = k * (score1 - expected1)
+    return int(rating1 + change), int(rating2 - change)
+
+
+def finish_match(cursor, match_id, player1_id, player2_id, winner_id):
+    # Must run inside the caller's write transaction. Returns the new ratings
+    # (player1, player2), or None when the match was already finished.
+    cursor.execute("""
+        UPDATE matches
+        SET status = 'finished', winner_id = ?, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'active'
+    """, (winner_id, match_id))
+    if cursor.rowcount == 0:
+        return None
+    return update_ratings(cursor, player1_id, player2_id, winner_id)
+
+
+def update_ratings(cursor, player1_id, player2_id, winner_id):
+    cursor.execute("SELECT id, rating FROM users WHERE id IN (?, ?)", (player1_id, player2_id))
+    ratings = dict(cursor.fetchall())
+
+    if winner_id == player1_id:
+        score1 = 1
+    elif winner_id == player2_id:
+        score1 = 0
+    else:
+        score1 = 0.5
+    new_rating1, new_rating2 = elo_ratings(ratings[player1_id], ratings[player2_id], score1)
+
+    cursor.execute("""
+        UPDATE users SET rating = CASE id WHEN ? THEN ? ELSE ? END
+        WHERE id IN (?, ?)
+        RETURNING id, rating
+    """, (player1_id, new_rating1, new_rating2, player1_id, player2_id))
+    committed = dict(cursor.fetchall())
+    return committed[player1_id], committed[player2_id]
+
+
+def publish_match_finished(bus, match_id, player1_id, player2_id, new_ratings, message):
+    # Cache updates and notifications once finish_match has been committed
+    leaderboard.set_rating(player1_id, new_ratings[0])
+    leaderboard.set_rating(player2_id, new_ratings[1])
+    user_profiles.invalidate(player1_id)
+    user_profiles.invalidate(player2_id)
+    counters.increment('matches_played')
+    lobby.match_finished(int(match_id))
+    if bus:
+        bus.notify_stats_changed(player1_id, player2_id)
+        bus.broadcast_to_match(match_id, message)
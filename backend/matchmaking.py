@@ -0,0 +1,222 @@
+import bisect
+import threading
+import time
+
+import broadcast_bus
+from config import (
+    MATCHMAKING_BASE_WINDOW, MATCHMAKING_WINDOW_GROWTH, MATCHMAKING_MAX_WINDOW,
+    MATCHMAKING_MAX_WAIT, MATCHMAKING_SWEEP_INTERVAL
+)
+from db_pool import get_connection
+from lobby import lobby
+from leaderboard import leaderboard
+from periodic import start_periodic
+from problem_sampler import problem_sampler
+from rooms import user_room
+
+MATCH_DETAILS_QUERY = """
+    SELECT m.id, m.status, m.problem_id, m.player1_id, m.player2_id,
+           p.title, p.description, p.difficulty, p.category,
+           u1.username as player1_username,
+           u2.username as player2_username,
+           m.started_at
+    FROM matches m
+    LEFT JOIN problems p ON m.problem_id = p.id
+    LEFT JOIN users u1 ON m.player1_id = u1.id
+    LEFT JOIN users u2 ON m.player2_id = u2.id
+    WHERE m.id = ?
+"""
+
+
+def match_started_message(row):
+    # row comes from MATCH_DETAILS_QUERY
+    return {
+        'type': 'match_started',
+        'match_id': row[0],
+        'player1_id': row[3],
+        'player2_id': row[4],
+        'player1_username': row[9],
+        'player2_username': row[10],
+        'problem': {
+            'title': row[5],
+            'description': row[6],
+            'difficulty': row[7],
+            'category': row[8]
+        }
+    }
+
+
+def has_open_match(user_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT 1 FROM matches WHERE player1_id = ? AND status IN ('waiting', 'active')
+        UNION ALL
+        SELECT 1 FROM matches WHERE player2_id = ? AND status IN ('waiting', 'active')
+        LIMIT 1
+    """, (user_id, user_id))
+    found = cursor.fetchone() is not None
+    conn.close()
+    return found
+
+
+def create_queued_match(player1_id, player2_id):
+    ratings = [rating for rating in (leaderboard.rating(player1_id), leaderboard.rating(player2_id)) if rating is not None]
+    rating = sum(ratings) / len(ratings) if ratings else None
+    problem_id = problem_sampler.pick([player1_id, player2_id], rating)
+    if problem_id is None:
+        return None
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # The match is created already active, so nobody else can join it
+    cursor.execute(
+        """INSERT INTO matches (player1_id, player2_id, problem_id, status, started_at)
+           VALUES (?, ?, ?, 'active', CURRENT_TIMESTAMP)""",
+        (player1_id, player2_id, problem_id)
+    )
+    match_id = cursor.lastrowid
+    conn.commit()
+    problem_sampler.record(problem_id, player1_id, player2_id)
+
+    cursor.execute(MATCH_DETAILS_QUERY, (match_id,))
+    row = cursor.fetchone()
+    conn.close()
+
+    lobby.match_created(match_id, row[11], row[9], row[5], row[10])
+    message = match_started_message(row)
+    broadcast_bus.bus.broadcast_to_room(user_room(player1_id), message)
+    broadcast_bus.bus.broadcast_to_room(user_room(player2_id), message)
+    return match_id
+
+
+class Matchmaker:
+    # Players waiting for an opponent, kept sorted by rating so the closest
+    # opponent is always a neighbour found by binary search. The accepted
+    # rating difference widens the longer a player waits.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = []
+        self.waiting = {}
+        self.matches_made = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def window(self, enqueued_at, now):
+        return min(MATCHMAKING_MAX_WINDOW, MATCHMAKING_BASE_WINDOW + MATCHMAKING_WINDOW_GROWTH * (now - enqueued_at))
+
+    def enqueue(self, user_id, rating):
+        # Returns the id of the opponent when one is available right away
+        now = time.monotonic()
+        with self.lock:
+            self.remove(user_id)
+            index = bisect.bisect_left(self.queue, (rating, user_id))
+
+            best = None
+            for neighbour in (index - 1, index):
+                if 0 <= neighbour < len(self.queue):
+                    other_rating, other_id = self.queue[neighbour]
+                    distance = abs(other_rating - rating)
+                    if distance <= self.window(self.waiting[other_id][1], now) and (best is None or distance < best[0]):
+                        best = (distance, other_id)
+
+            if best:
+                self.remove(best[1])
+                self.matches_made += 1
+                return best[1]
+
+            self.queue.insert(index, (rating, user_id))
+            self.waiting[user_id] = (rating, now)
+            return None
+
+    def start_match(self, player1_id, player2_id):
+        # Both players have already left the queue; if their match cannot be
+        # created they are told so rather than left waiting for nothing.
+        try:
+            match_id = create_queued_match(player1_id, player2_id)
+        except Exception as e:
+            print(f"⚠️ Matchmaking: could not create match: {e}")
+            match_id = None
+
+        if match_id is None:
+            with self.lock:
+                self.failures += 1
+            for user_id in (player1_id, player2_id):
+                broadcast_bus.bus.broadcast_to_room(user_room(user_id), {'type': 'queue_failed'})
+        return match_id
+
+    def dequeue(self, user_id):
+        with self.lock:
+            return self.remove(user_id)
+
+    def remove(self, user_id):
+        entry = self.waiting.pop(user_id, None)
+        if entry is None:
+            return False
+        del self.queue[bisect.bisect_left(self.queue, (entry[0], user_id))]
+        return True
+
+    def is_queued(self, user_id):
+        with self.lock:
+            return user_id in self.waiting
+
+    def size(self):
+        with self.lock:
+            return len(self.queue)
+
+    def sweep(self):
+        # Pairs neighbours whose windows have grown enough and drops players
+        # who waited too long.
+        now = time.monotonic()
+        pairs = []
+        expired = []
+        with self.lock:
+            remaining = []
+            index = 0
+            while index < len(self.queue):
+                rating, user_id = self.queue[index]
+                enqueued_at = self.waiting[user_id][1]
+                if now - enqueued_at > MATCHMAKING_MAX_WAIT:
+                    expired.append(user_id)
+                    index += 1
+                    continue
+                if index + 1 < len(self.queue):
+                    other_rating, other_id = self.queue[index + 1]
+                    other_enqueued_at = self.waiting[other_id][1]
+                    allowed = max(self.window(enqueued_at, now), self.window(other_enqueued_at, now))
+                    if now - other_enqueued_at <= MATCHMAKING_MAX_WAIT and other_rating - rating <= allowed:
+                        pairs.append((user_id, other_id) if enqueued_at <= other_enqueued_at else (other_id, user_id))
+                        index += 2
+                        continue
+                remaining.append((rating, user_id))
+                index += 1
+
+            self.queue = remaining
+            for user_id in expired:
+                del self.waiting[user_id]
+            for first, second in pairs:
+                del self.waiting[first]
+                del self.waiting[second]
+            self.matches_made += len(pairs)
+            self.timeouts += len(expired)
+
+        for user_id in expired:
+            broadcast_bus.bus.broadcast_to_room(user_room(user_id), {'type': 'queue_timeout'})
+        for first, second in pairs:
+            self.start_match(first, second)
+
+    def start_sweeper(self, interval=MATCHMAKING_SWEEP_INTERVAL):
+        return start_periodic(self.sweep, interval, "Matchmaking sweep")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queued': len(self.queue),
+                'matches_made': self.matches_made,
+                'timeouts': self.timeouts,
+                'failures': self.failures
+            }
+
+
+matchmaker = Matchmaker()
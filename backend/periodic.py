@@ -0,0 +1,20 @@
+import threading
+import time
+
+
+def run_periodic(fn, interval, label):
+    while True:
+        time.sleep(interval)
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ {label} failed: {e}")
+
+
+def start_periodic(fn, interval, label):
+    # Calls fn every interval seconds on a daemon thread; an interval of 0 disables it
+    if not interval:
+        return None
+    thread = threading.Thread(target=run_periodic, args=(fn, interval, label), daemon=True)
+    thread.start()
+    return thread
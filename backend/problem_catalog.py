@@ -0,0 +1,95 @@
+import json
+import threading
+
+from db_pool import get_connection
+from broadcast_bus import replicated
+
+
+def difficulty_text(difficulty):
+    return ['Легкая', 'Средняя', 'Сложная'][difficulty-1] if difficulty in [1,2,3] else 'Неизвестно'
+
+
+def render_problem_list(problems):
+    return json.dumps({'success': True, 'problems': problems}, ensure_ascii=False).encode('utf-8')
+
+
+class CatalogSnapshot:
+    def __init__(self, rows):
+        self.problems = {}
+        self.public = []
+        for row in rows:
+            problem = {
+                'id': row[0],
+                'title': row[1],
+                'description': row[2],
+                'answer': row[3],
+                'difficulty': row[4],
+                'difficulty_text': difficulty_text(row[4]),
+                'category': row[5],
+                'tags': row[6].split(',') if row[6] else []
+            }
+            self.problems[problem['id']] = problem
+            self.public.append({key: value for key, value in problem.items() if key != 'answer'})
+
+        self.public.sort(key=lambda problem: (problem['difficulty'], problem['id']))
+        self.ids = [problem['id'] for problem in self.public]
+
+        self.by_category = {}
+        self.by_difficulty = {}
+        # Problem ids by (category, difficulty); None in either place matches any
+        self.buckets = {(None, None): self.ids}
+        for problem in self.public:
+            self.by_category.setdefault(problem['category'], []).append(problem)
+            self.by_difficulty.setdefault(problem['difficulty'], []).append(problem)
+            for key in ((problem['category'], problem['difficulty']), (problem['category'], None), (None, problem['difficulty'])):
+                self.buckets.setdefault(key, []).append(problem['id'])
+
+        self.rendered = {(None, None): render_problem_list(self.public)}
+        for category, problems in self.by_category.items():
+            self.rendered[(category, None)] = render_problem_list(problems)
+            for difficulty in self.by_difficulty:
+                self.rendered[(category, difficulty)] = render_problem_list(
+                    [problem for problem in problems if problem['difficulty'] == difficulty]
+                )
+        for difficulty, problems in self.by_difficulty.items():
+            self.rendered[(None, difficulty)] = render_problem_list(problems)
+
+
+class ProblemCatalog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = CatalogSnapshot([])
+        self.version = 0
+
+    @replicated('problem_catalog')
+    def load(self):
+        # Loads run one at a time from query to swap, so a slower load that
+        # read the table earlier can never replace a newer snapshot. Readers
+        # take self.snapshot without the lock.
+        with self.lock:
+            conn = get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, title, description, answer, difficulty, category, tags
+                FROM problems
+            """)
+            snapshot = CatalogSnapshot(cursor.fetchall())
+            conn.close()
+
+            self.snapshot = snapshot
+            self.version += 1
+
+    def get(self, problem_id):
+        return self.snapshot.problems.get(problem_id)
+
+    def list_json(self, category=None, difficulty=None):
+        body = self.snapshot.rendered.get((category, difficulty))
+        if body is None:
+            body = render_problem_list([])
+        return body
+
+    def count(self):
+        return len(self.snapshot.ids)
+
+
+problem_catalog = ProblemCatalog()
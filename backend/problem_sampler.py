@@ -0,0 +1,71 @@
+import bisect
+import random
+import threading
+from collections import deque
+
+from broadcast_bus import replicated
+from config import MATCH_DIFFICULTY_RATINGS, MATCH_PROBLEM_HISTORY
+from problem_catalog import problem_catalog
+
+# Random draws tried before scanning a bucket for problems nobody has seen
+SAMPLE_ATTEMPTS = 8
+
+
+def target_difficulty(rating):
+    if rating is None:
+        return None
+    return bisect.bisect_right(MATCH_DIFFICULTY_RATINGS, rating) + 1
+
+
+class ProblemSampler:
+    # Picks match problems from the catalog's id buckets, preferring the
+    # difficulty that suits the players and skipping problems either of them
+    # played recently. The buckets are rebuilt with every catalog load.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history = {}
+
+    def recent(self, user_ids):
+        with self.lock:
+            return {problem_id for user_id in user_ids for problem_id in self.history.get(user_id, ())}
+
+    @replicated('problem_sampler')
+    def record(self, problem_id, *user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                history = self.history.get(user_id)
+                if history is None:
+                    history = self.history[user_id] = deque(maxlen=MATCH_PROBLEM_HISTORY)
+                history.append(problem_id)
+
+    def pick(self, user_ids, rating=None, category=None):
+        snapshot = problem_catalog.snapshot
+        buckets = snapshot.buckets
+        if category not in snapshot.by_category:
+            category = None
+
+        if not buckets.get((category, None)):
+            return None
+
+        target = target_difficulty(rating)
+        difficulties = sorted(snapshot.by_difficulty, key=lambda difficulty: abs(difficulty - target)) if target else [None]
+        exclude = self.recent(user_ids)
+
+        for difficulty in difficulties:
+            ids = buckets.get((category, difficulty))
+            if not ids:
+                continue
+            for _ in range(SAMPLE_ATTEMPTS):
+                problem_id = random.choice(ids)
+                if problem_id not in exclude:
+                    return problem_id
+            unseen = [problem_id for problem_id in ids if problem_id not in exclude]
+            if unseen:
+                return random.choice(unseen)
+
+        # Both players have seen everything that fits; repeat a problem
+        ids = buckets.get((category, difficulties[0])) or buckets[(category, None)]
+        return random.choice(ids)
+
+
+problem_sampler = ProblemSampler()
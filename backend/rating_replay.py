@@ -0,0 +1,204 @@
+import argparse
+import heapq
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import DB_FILE, MATCH_RATING_K, SOLUTION_RATING_PER_DIFFICULTY
+from database import apply_pragmas
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("⚠️ numpy not installed. Replaying ratings without vectorization (slower).")
+
+SOLUTION = 0
+MATCH = 1
+
+
+def stream(cursor, query, kind, chunk_size):
+    # Yields (time, kind, row) from query, fetching chunk_size rows at a time
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row[0], kind, row
+
+
+def load_events(conn, chunk_size):
+    # Correct solutions and finished two-player matches, merged in the order they happened
+    solutions = stream(conn.cursor(), f"""
+        SELECT s.solved_at, s.id, s.user_id, p.difficulty * {int(SOLUTION_RATING_PER_DIFFICULTY)}
+        FROM solutions s
+        JOIN problems p ON p.id = s.problem_id
+        WHERE s.is_correct
+        ORDER BY s.solved_at, s.id
+    """, SOLUTION, chunk_size)
+    matches = stream(conn.cursor(), """
+        SELECT finished_at, id, player1_id, player2_id, winner_id
+        FROM matches
+        WHERE status = 'finished' AND player2_id IS NOT NULL
+        ORDER BY finished_at, id
+    """, MATCH, chunk_size)
+    return heapq.merge(solutions, matches, key=lambda event: (event[0] or '', event[1], event[2][1]))
+
+
+class Wave:
+    # Events that can be applied together: matches with no player in common,
+    # plus solution points earned before (pre) or after (post) them.
+    def __init__(self):
+        self.players = set()
+        self.player1 = []
+        self.player2 = []
+        self.score1 = []
+        self.pre = {}
+        self.post = {}
+
+    def add_solution(self, user_id, points):
+        deltas = self.post if user_id in self.players else self.pre
+        deltas[user_id] = deltas.get(user_id, 0) + points
+
+    def add_match(self, player1_id, player2_id, winner_id):
+        # Returns False when a player already has a match in this wave
+        if player1_id in self.players or player2_id in self.players:
+            return False
+        self.players.add(player1_id)
+        self.players.add(player2_id)
+        self.player1.append(player1_id)
+        self.player2.append(player2_id)
+        if winner_id == player1_id:
+            self.score1.append(1.0)
+        elif winner_id == player2_id:
+            self.score1.append(0.0)
+        else:
+            self.score1.append(0.5)
+        return True
+
+
+def apply_deltas(ratings, deltas):
+    if not deltas:
+        return
+    if np is not None:
+        ratings[np.fromiter(deltas.keys(), np.int64, len(deltas))] += np.fromiter(deltas.values(), np.float64, len(deltas))
+    else:
+        for user_id, delta in deltas.items():
+            ratings[user_id] += delta
+
+
+def play_matches(ratings, wave, k):
+    # Same Elo update as match_results.finish_match, for all matches of the wave at once
+    if not wave.player1:
+        return
+    if np is not None:
+        player1 = np.array(wave.player1, np.int64)
+        player2 = np.array(wave.player2, np.int64)
+        rating1 = ratings[player1]
+        rating2 = ratings[player2]
+        expected1 = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+        change = k * (np.array(wave.score1) - expected1)
+        ratings[player1] = np.trunc(rating1 + change)
+        ratings[player2] = np.trunc(rating2 - change)
+    else:
+        for player1, player2, score1 in zip(wave.player1, wave.player2, wave.score1):
+            rating1, rating2 = ratings[player1], ratings[player2]
+            expected1 = 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+            change = k * (score1 - expected1)
+            ratings[player1] = int(rating1 + change)
+            ratings[player2] = int(rating2 - change)
+
+
+def apply_wave(ratings, wave, k):
+    apply_deltas(ratings, wave.pre)
+    play_matches(ratings, wave, k)
+    apply_deltas(ratings, wave.post)
+
+
+def replay(conn, k=MATCH_RATING_K, start_rating=1000, chunk_size=50000):
+    # Returns ({user_id: recomputed rating}, number of events replayed)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT MAX(
+            (SELECT COALESCE(MAX(id), 0) FROM users),
+            (SELECT COALESCE(MAX(user_id), 0) FROM solutions),
+            (SELECT COALESCE(MAX(MAX(player1_id), MAX(player2_id)), 0) FROM matches)
+        )
+    """)
+    size = cursor.fetchone()[0] + 1
+
+    # Indexed by user id; ids of deleted users are simply never written back
+    ratings = np.full(size, float(start_rating)) if np is not None else [start_rating] * size
+
+    events = 0
+    wave = Wave()
+    for _, kind, row in load_events(conn, chunk_size):
+        events += 1
+        if kind == SOLUTION:
+            wave.add_solution(row[2], row[3])
+        elif not wave.add_match(row[2], row[3], row[4]):
+            apply_wave(ratings, wave, k)
+            wave = Wave()
+            wave.add_match(row[2], row[3], row[4])
+    apply_wave(ratings, wave, k)
+
+    cursor.execute("SELECT id FROM users")
+    return {user_id: int(ratings[user_id]) for (user_id,) in cursor.fetchall()}, events
+
+
+def write_ratings(conn, changes):
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.executemany("UPDATE users SET rating = ? WHERE id = ?", [(rating, user_id) for user_id, rating in changes])
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute all user ratings by replaying solutions and matches in order."
+    )
+    parser.add_argument('--db', default=DB_FILE, help="database file (default: %(default)s)")
+    parser.add_argument('--k', type=float, default=MATCH_RATING_K, help="Elo K-factor for matches (default: %(default)s)")
+    parser.add_argument('--start-rating', type=int, default=1000, help="rating every user starts from (default: %(default)s)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="rows fetched per query round trip (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="only report the changes, do not write them")
+    parser.add_argument('--show', type=int, default=10, help="number of largest changes to print (default: %(default)s)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"database {args.db} not found")
+
+    conn = sqlite3.connect(args.db)
+    apply_pragmas(conn)
+    cursor = conn.cursor()
+
+    started = time.perf_counter()
+    recomputed, events = replay(conn, args.k, args.start_rating, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    cursor.execute("SELECT id, username, rating FROM users")
+    current = {user_id: (username, rating) for user_id, username, rating in cursor.fetchall()}
+    changes = [(user_id, rating) for user_id, rating in recomputed.items() if rating != current[user_id][1]]
+
+    print(f"🔁 Replayed {events} events for {len(recomputed)} users in {elapsed:.2f}s")
+    print(f"📊 Ratings that differ: {len(changes)}")
+    largest = sorted(changes, key=lambda change: abs(change[1] - current[change[0]][1]), reverse=True)
+    for user_id, rating in largest[:args.show]:
+        username, old_rating = current[user_id]
+        print(f"   {username} (#{user_id}): {old_rating} -> {rating} ({rating - old_rating:+d})")
+
+    if args.dry_run or not changes:
+        conn.close()
+        return
+
+    write_ratings(conn, changes)
+    conn.close()
+    print(f"✅ Wrote {len(changes)} ratings. Restart the server so its caches pick them up.")
+
+
+if __name__ == "__main__":
+    main()
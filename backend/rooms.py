@@ -0,0 +1,70 @@
+import threading
+
+
+def match_room(match_id):
+    try:
+        return ('match', int(match_id))
+    except (TypeError, ValueError):
+        return ('match', match_id)
+
+
+LOBBY_ROOM = ('lobby', None)
+
+
+def user_room(user_id):
+    # Every connection of an authenticated user, for messages addressed to them
+    return ('user', int(user_id))
+
+
+def stats_room(user_id=None):
+    # ('stats', None) gets platform counters, ('stats', user_id) one user's own stats
+    return ('stats', user_id)
+
+
+class RoomRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rooms = {}
+        self.memberships = {}
+
+    def join(self, room, client):
+        with self.lock:
+            self.rooms.setdefault(room, set()).add(client)
+            self.memberships.setdefault(client, set()).add(room)
+
+    def leave(self, room, client):
+        with self.lock:
+            self.discard(room, client)
+            joined = self.memberships.get(client)
+            if joined is not None:
+                joined.discard(room)
+                if not joined:
+                    del self.memberships[client]
+
+    def leave_all(self, client):
+        with self.lock:
+            joined = self.memberships.pop(client, set())
+            for room in joined:
+                self.discard(room, client)
+            return joined
+
+    def discard(self, room, client):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del self.rooms[room]
+
+    def members(self, room):
+        with self.lock:
+            return tuple(self.rooms.get(room, ()))
+
+    def rooms_of(self, client):
+        with self.lock:
+            return set(self.memberships.get(client, ()))
+
+    def count(self, kind=None):
+        with self.lock:
+            if kind is None:
+                return len(self.rooms)
+            return sum(1 for room in self.rooms if room[0] == kind)
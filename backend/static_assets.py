@@ -0,0 +1,149 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from config import FRONTEND_DIR, STATIC_RELOAD_INTERVAL, GZIP_MIN_SIZE, BUNDLE_COMPONENTS, FRONTEND_COMPONENTS
+from http_utils import gzip_body, etag_matches
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+LOCAL_REFERENCE = re.compile(r'(src|href)="([^":?#]+)"')
+
+mimetypes.init()
+
+
+class StaticAsset:
+    def __init__(self, url_path, filename, content, mtime, modified=None):
+        self.url_path = url_path
+        self.filename = filename
+        self.content = content
+        self.mtime = mtime
+        self.modified = int(modified if modified is not None else mtime)
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+        content_type, _ = mimetypes.guess_type(filename)
+        self.content_type = content_type or 'text/html'
+
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        self.version = digest[:12]
+        self.etag = f'"{digest}"'
+
+        self.gzipped = None
+        if len(content) >= GZIP_MIN_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip_body(content)
+            if len(gzipped) < len(content):
+                self.gzipped = gzipped
+
+    def not_modified(self, if_none_match, if_modified_since):
+        if if_none_match:
+            return etag_matches(if_none_match, self.etag)
+        if if_modified_since:
+            try:
+                return self.modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class StaticAssetCache:
+    def __init__(self, root=FRONTEND_DIR, reload_interval=STATIC_RELOAD_INTERVAL):
+        self.root = root
+        self.reload_interval = reload_interval
+        self.assets = {}
+        self.lock = threading.Lock()
+        self.last_check = 0.0
+
+    def scan(self):
+        found = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                filename = os.path.join(directory, name)
+                url_path = '/' + os.path.relpath(filename, self.root).replace(os.sep, '/')
+                try:
+                    found[url_path] = (filename, os.stat(filename).st_mtime)
+                except OSError:
+                    pass
+        return found
+
+    def load(self):
+        with self.lock:
+            self.reload(self.scan())
+            self.last_check = time.monotonic()
+
+    def reload(self, found):
+        assets = {}
+        changed = False
+        for url_path, (filename, mtime) in found.items():
+            current = self.assets.get(url_path)
+            if current and current.mtime == mtime:
+                assets[url_path] = current
+                continue
+            try:
+                with open(filename, 'rb') as f:
+                    assets[url_path] = StaticAsset(url_path, filename, f.read(), mtime)
+                changed = True
+            except OSError as e:
+                print(f"Error loading static file {filename}: {e}")
+
+        if changed or assets.keys() != self.assets.keys():
+            self.render_pages(assets)
+        self.assets = assets
+
+    def render_pages(self, assets):
+        # HTML pages reference other assets by content-hashed URL, so those
+        # can be cached by browsers for a long time.
+        latest_mtime = max((asset.mtime for asset in assets.values()), default=0)
+        for url_path, asset in list(assets.items()):
+            if not asset.filename.endswith('.html'):
+                continue
+            with open(asset.filename, 'rb') as f:
+                html = f.read().decode('utf-8')
+            base = url_path.rsplit('/', 1)[0] + '/'
+
+            def versioned(match):
+                target = assets.get(os.path.normpath(base + match.group(2)).replace(os.sep, '/'))
+                if not target or target.filename.endswith('.html'):
+                    return match.group(0)
+                return f'{match.group(1)}="{match.group(2)}?v={target.version}"'
+
+            content = LOCAL_REFERENCE.sub(versioned, html).encode('utf-8')
+            assets[url_path] = StaticAsset(url_path, asset.filename, content, asset.mtime, latest_mtime)
+
+        if BUNDLE_COMPONENTS:
+            self.bundle_components(assets, latest_mtime)
+
+    def bundle_components(self, assets, modified):
+        # Inline the component placeholders of index.html so the page needs
+        # one request instead of one per component.
+        index = assets.get('/index.html')
+        if not index:
+            return
+        html = index.content.decode('utf-8')
+        for element_id, component_path in FRONTEND_COMPONENTS.items():
+            component = assets.get('/' + component_path)
+            placeholder = f'<div id="{element_id}"></div>'
+            if component and placeholder in html:
+                html = html.replace(placeholder, f'<div id="{element_id}">{component.content.decode("utf-8")}</div>')
+        assets['/index.html'] = StaticAsset('/index.html', index.filename, html.encode('utf-8'), index.mtime, modified)
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self.last_check < self.reload_interval:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.reload(self.scan())
+            self.last_check = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def get(self, url_path):
+        if self.reload_interval:
+            self.refresh_if_stale()
+        return self.assets.get(url_path)
+
+
+static_assets = StaticAssetCache()
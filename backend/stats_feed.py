@@ -0,0 +1,93 @@
+import threading
+import time
+
+from config import WS_STATS_DEBOUNCE
+from counters import counters
+from rooms import stats_room
+from user_stats import load_user_stats
+
+
+class StatsPublisher:
+    # Pushes platform counters and per-user stats to subscribers of the
+    # 'stats' channel. Changes arriving within WS_STATS_DEBOUNCE seconds are
+    # published together, and database reads happen on this thread instead of
+    # the event loops.
+    def __init__(self, server, debounce=WS_STATS_DEBOUNCE):
+        self.server = server
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.platform_dirty = False
+        self.dirty_users = set()
+        self.new_subscribers = []
+        self.last_platform = None
+        self.published = 0
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def subscribe(self, client, user_id=None):
+        self.server.rooms.join(stats_room(), client)
+        if user_id is not None:
+            self.server.rooms.join(stats_room(user_id), client)
+        with self.lock:
+            self.new_subscribers.append((client, user_id))
+        self.wakeup.set()
+
+    def unsubscribe(self, client, user_id=None):
+        self.server.rooms.leave(stats_room(), client)
+        if user_id is not None:
+            self.server.rooms.leave(stats_room(user_id), client)
+
+    def platform_changed(self):
+        with self.lock:
+            self.platform_dirty = True
+        self.wakeup.set()
+
+    def users_changed(self, *user_ids):
+        with self.lock:
+            self.dirty_users.update(user_ids)
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            # New subscribers are answered right away, changes are debounced
+            if not self.new_subscribers:
+                time.sleep(self.debounce)
+            self.wakeup.clear()
+            with self.lock:
+                platform_dirty, self.platform_dirty = self.platform_dirty, False
+                dirty_users, self.dirty_users = self.dirty_users, set()
+                new_subscribers, self.new_subscribers = self.new_subscribers, []
+            try:
+                self.publish(platform_dirty, dirty_users, new_subscribers)
+            except Exception as e:
+                print(f"⚠️ Stats publish failed: {e}")
+
+    def publish(self, platform_dirty, dirty_users, new_subscribers):
+        platform = counters.snapshot()
+        if platform_dirty and platform != self.last_platform:
+            self.server.broadcast_to_room(stats_room(), {'type': 'stats', 'platform': platform})
+            self.published += 1
+        self.last_platform = platform
+
+        users = {}
+        for user_id in dirty_users:
+            if self.server.rooms.members(stats_room(user_id)):
+                users[user_id] = load_user_stats(user_id)
+                if users[user_id]:
+                    self.server.broadcast_to_room(stats_room(user_id), {'type': 'stats', 'user': users[user_id]})
+                    self.published += 1
+
+        # New subscribers get a full snapshot, whether or not anything changed
+        for client, user_id in new_subscribers:
+            message = {'type': 'stats', 'platform': platform}
+            if user_id is not None:
+                if user_id not in users:
+                    users[user_id] = load_user_stats(user_id)
+                if users[user_id]:
+                    message['user'] = users[user_id]
+            self.server.send_json(client, message)
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    # DB_FILE is relative, so every test gets its own migrated database
+    monkeypatch.chdir(tmp_path)
+    from config import DB_FILE
+    from database import init_database
+    from db_pool import pool
+    init_database()
+    yield tmp_path / DB_FILE
+    # Pooled connections stay bound to this test's database file
+    pool.close_all()
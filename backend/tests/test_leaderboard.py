@@ -0,0 +1,19 @@
+from db_pool import get_connection
+from leaderboard import leaderboard
+
+
+def test_refresh_repairs_out_of_order_updates(fresh_db):
+    leaderboard.refresh()
+    conn = get_connection()
+    conn.execute("UPDATE users SET rating = 1040 WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    # A solution committed after a match, but applied to the cache before it
+    leaderboard.record_solution(1, True, rating=1040)
+    leaderboard.set_rating(1, 1010)
+    assert leaderboard.rating(1) == 1010
+
+    leaderboard.refresh()
+    assert leaderboard.rating(1) == 1040
+    assert leaderboard.rank(1) == 1
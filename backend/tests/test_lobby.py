@@ -0,0 +1,10 @@
+from lobby import MatchLobby
+
+
+def test_join_arriving_before_create_keeps_the_match_active():
+    lobby = MatchLobby()
+    lobby.match_joined(7, '2026-01-01 10:00:01', 'bob', 'alice', 'Sums')
+    lobby.match_created(7, '2026-01-01 10:00:00', 'alice', 'Sums')
+
+    match, = lobby.list()
+    assert (match['status'], match['player1'], match['player2'], match['problem']) == ('active', 'alice', 'bob', 'Sums')
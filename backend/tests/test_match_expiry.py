@@ -0,0 +1,55 @@
+import pytest
+
+import broadcast_bus
+from db_pool import get_connection
+from match_expiry import MatchExpiry
+from problem_catalog import problem_catalog
+
+
+@pytest.fixture
+def db(fresh_db, monkeypatch):
+    monkeypatch.setattr(broadcast_bus, 'bus', broadcast_bus.LocalBus())
+    problem_catalog.load()
+    conn = get_connection()
+    yield conn.cursor()
+    conn.close()
+
+
+def add_stale_match(cursor, player1_answer, player2_answer, ratings=(1000, 1000)):
+    player_ids = []
+    for rating in ratings:
+        cursor.execute("INSERT INTO users (username, password, rating) VALUES ('p' || random(), 'x', ?)", (rating,))
+        player_ids.append(cursor.lastrowid)
+    player1_id, player2_id = player_ids
+    cursor.execute("""
+        INSERT INTO matches (player1_id, player2_id, problem_id, status, player1_answer, player2_answer, started_at)
+        VALUES (?, ?, 1, 'active', ?, ?, datetime('now', '-1 day'))
+    """, (player1_id, player2_id, player1_answer, player2_answer))
+    cursor.connection.commit()
+    return cursor.lastrowid, player1_id, player2_id
+
+
+def result(cursor, match_id, player1_id, player2_id):
+    cursor.execute("SELECT status, winner_id FROM matches WHERE id = ?", (match_id,))
+    status, winner_id = cursor.fetchone()
+    cursor.execute("SELECT rating FROM users WHERE id IN (?, ?) ORDER BY id", (player1_id, player2_id))
+    return status, winner_id, [row[0] for row in cursor.fetchall()]
+
+
+def test_only_a_correct_lone_answer_wins_by_forfeit(db):
+    answer = problem_catalog.get(1)['answer']
+    correct = add_stale_match(db, answer, None)
+    wrong = add_stale_match(db, None, 'definitely wrong', (1200, 1000))
+    abandoned = add_stale_match(db, None, None, (1200, 1000))
+
+    assert MatchExpiry().expire() == (1, 2)
+
+    status, winner_id, ratings = result(db, *correct)
+    assert (status, winner_id) == ('finished', correct[1])
+    assert ratings[0] > 1000 > ratings[1]
+
+    # A wrong lone answer is a rated draw; an abandoned match expires unrated
+    status, winner_id, ratings = result(db, *wrong)
+    assert (status, winner_id) == ('finished', None)
+    assert ratings[0] < 1200 and ratings[1] > 1000
+    assert result(db, *abandoned) == ('expired', None, [1200, 1000])
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+import broadcast_bus
+import matchmaking
+from db_pool import get_connection
+from matchmaking import Matchmaker, has_open_match
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    bus = broadcast_bus.LocalBus()
+    messages = []
+    bus.subscribe('room', messages.append)
+    monkeypatch.setattr(broadcast_bus, 'bus', bus)
+    return messages
+
+
+def test_failed_pair_is_notified_and_other_pairs_still_start(monkeypatch, sent):
+    started = []
+
+    def create(player1_id, player2_id):
+        if player1_id == 1:
+            raise RuntimeError("no problems")
+        started.append((player1_id, player2_id))
+        return 99
+
+    monkeypatch.setattr(matchmaking, 'create_queued_match', create)
+    matchmaker = Matchmaker()
+    # Far enough apart that nobody is paired on enqueue
+    for user_id, rating in ((1, 1000), (2, 1300), (3, 2000), (4, 2300)):
+        assert matchmaker.enqueue(user_id, rating) is None
+    long_ago = time.monotonic() - 30
+    for user_id, (rating, _) in list(matchmaker.waiting.items()):
+        matchmaker.waiting[user_id] = (rating, long_ago)
+
+    matchmaker.sweep()
+
+    assert started == [(3, 4)]
+    failed = sorted(message['room'][1] for message in sent if message['message']['type'] == 'queue_failed')
+    assert failed == [1, 2]
+    assert matchmaker.stats()['failures'] == 1
+    assert matchmaker.size() == 0
+
+
+def test_has_open_match(fresh_db):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO matches (player1_id, status) VALUES (1, 'waiting')")
+    cursor.execute("INSERT INTO matches (player1_id, player2_id, status) VALUES (3, 2, 'finished')")
+    conn.commit()
+    conn.close()
+
+    assert has_open_match(1)
+    assert not has_open_match(2)
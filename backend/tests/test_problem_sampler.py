@@ -0,0 +1,35 @@
+import pytest
+
+from problem_catalog import problem_catalog, CatalogSnapshot
+from problem_sampler import problem_sampler
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    def install(rows):
+        monkeypatch.setattr(problem_catalog, 'snapshot', CatalogSnapshot(rows))
+    return install
+
+
+def test_empty_catalog_has_nothing_to_pick(catalog):
+    catalog([])
+    assert problem_sampler.pick([1], rating=1500) is None
+    assert problem_sampler.pick([1]) is None
+    assert problem_sampler.pick([1], rating=1500, category='Алгебра') is None
+
+
+def test_unknown_category_falls_back_to_any(catalog):
+    catalog([(1, 't', 'd', 'a', 1, 'Алгебра', '')])
+    assert problem_sampler.pick([1], rating=1500, category='Логика') == 1
+
+
+def test_targets_difficulty_and_skips_recent(catalog, monkeypatch):
+    monkeypatch.setattr(problem_sampler, 'history', {})
+    catalog([
+        (1, 't', 'd', 'a', 1, 'Алгебра', ''),
+        (2, 't', 'd', 'a', 3, 'Алгебра', ''),
+        (3, 't', 'd', 'a', 3, 'Алгебра', ''),
+    ])
+    assert problem_sampler.pick([7], rating=900) == 1
+    problem_sampler.record(2, 7)
+    assert problem_sampler.pick([7], rating=2000) == 3
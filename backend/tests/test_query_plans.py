@@ -0,0 +1,65 @@
+import re
+import sqlite3
+
+import pytest
+
+from api_handlers import OlympiadHandler
+from config import DB_FILE
+from counters import counters
+from db_pool import pool, get_connection
+from leaderboard import leaderboard
+from lobby import lobby
+from problem_catalog import problem_catalog
+from user_stats import load_user_stats
+
+TABLE_NAMES = re.compile(r'\b(?:FROM|JOIN)\s+(solutions|matches)\b(?:\s+(?:AS\s+)?(?!WHERE|ON|JOIN|LEFT|GROUP|ORDER|LIMIT|UNION)(\w+))?', re.IGNORECASE)
+
+
+@pytest.fixture
+def statements(fresh_db, monkeypatch):
+    # Every statement the hot paths run, with parameters bound
+    executed = []
+    create_connection = pool.create_connection
+
+    def traced_connection():
+        conn = create_connection()
+        conn.set_trace_callback(executed.append)
+        return conn
+
+    pool.close_all()
+    monkeypatch.setattr(pool, 'create_connection', traced_connection)
+    return executed
+
+
+def full_scans(statement):
+    # Plan rows that read all of solutions or matches, by table name or alias
+    names = set()
+    for table, alias in TABLE_NAMES.findall(statement):
+        names.update(name.lower() for name in (table, alias) if name)
+    if not names:
+        return []
+
+    conn = sqlite3.connect(DB_FILE)
+    plan = conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+    conn.close()
+    return [row[3] for row in plan if row[3].startswith('SCAN ') and row[3].split()[1].lower() in names]
+
+
+def test_hot_queries_do_not_scan(statements, monkeypatch):
+    handler = OlympiadHandler.__new__(OlympiadHandler)
+
+    load_user_stats(1)
+    conn = get_connection()
+    handler.check_achievements(conn.cursor(), 1)
+    conn.close()
+    leaderboard.load()
+    lobby.load()
+    # delete_problem also reloads these; counting and listing everything is their job
+    monkeypatch.setattr(counters, 'load', lambda: None)
+    monkeypatch.setattr(problem_catalog, 'load', lambda: None)
+    handler.delete_problem({'user_id': 1, 'problem_id': 1})
+
+    checked = [statement for statement in statements if TABLE_NAMES.search(statement)]
+    assert len(checked) >= 8
+    for statement in checked:
+        assert full_scans(statement) == [], statement
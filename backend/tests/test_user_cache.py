@@ -0,0 +1,23 @@
+from db_pool import get_connection
+from user_cache import UserProfileCache
+
+
+def test_fetch_racing_invalidate_is_not_cached(fresh_db):
+    cache = UserProfileCache()
+    fetch = cache.fetch
+
+    def stale_fetch(user_id):
+        profile = fetch(user_id)
+        # The rating changes and is invalidated while the old row is in flight
+        conn = get_connection()
+        conn.execute("UPDATE users SET rating = 1500 WHERE id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+        cache.invalidate(user_id)
+        return profile
+
+    cache.fetch = stale_fetch
+    assert cache.get(1)['rating'] == 1000
+
+    cache.fetch = fetch
+    assert cache.get(1)['rating'] == 1500
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import USER_CACHE_TTL, USER_CACHE_SIZE
+from db_pool import get_connection
+from broadcast_bus import replicated
+
+
+class UserProfileCache:
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # user_id -> (expires_at, profile), least recently used first
+        self.profiles = OrderedDict()
+        # user_id -> number of invalidations, so a fetch that raced one is not stored
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.profiles.get(user_id)
+            if cached and cached[0] > now:
+                self.profiles.move_to_end(user_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            generation = self.generations.get(user_id, 0)
+
+        profile = self.fetch(user_id)
+        if profile is not None:
+            with self.lock:
+                if self.generations.get(user_id, 0) != generation:
+                    return profile
+                self.profiles[user_id] = (now + self.ttl, profile)
+                self.profiles.move_to_end(user_id)
+                while len(self.profiles) > self.max_size:
+                    self.profiles.popitem(last=False)
+        return profile
+
+    def fetch(self, user_id):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username, rating, role FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {'id': row[0], 'username': row[1], 'rating': row[2], 'role': row[3]}
+
+    @replicated('user_profiles')
+    def invalidate(self, user_id):
+        with self.lock:
+            self.profiles.pop(user_id, None)
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.profiles), 'hits': self.hits, 'misses': self.misses}
+
+
+user_profiles = UserProfileCache()
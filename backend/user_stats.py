@@ -0,0 +1,84 @@
+from db_pool import get_connection
+
+
+def load_user_stats(user_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT username, rating, role, total_xp, level FROM users WHERE id = ?", (user_id,))
+    user_info = cursor.fetchone()
+    
+    if not user_info:
+        conn.close()
+        return None
+    
+    cursor.execute("""
+        SELECT 
+            COUNT(*) as total,
+            SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as correct,
+            AVG(time_spent) as avg_time
+        FROM solutions 
+        WHERE user_id = ?
+    """, (user_id,))
+    
+    stats = cursor.fetchone()
+    total = stats[0] or 0
+    correct = stats[1] or 0
+    avg_time = stats[2] or 0
+    
+    cursor.execute("""
+        SELECT 
+            p.category,
+            COUNT(*) as total,
+            SUM(CASE WHEN s.is_correct THEN 1 ELSE 0 END) as correct
+        FROM solutions s
+        JOIN problems p ON s.problem_id = p.id
+        WHERE s.user_id = ?
+        GROUP BY p.category
+        ORDER BY total DESC
+    """, (user_id,))
+    
+    categories = []
+    for row in cursor.fetchall():
+        categories.append({
+            'category': row[0],
+            'total': row[1],
+            'correct': row[2],
+            'accuracy': round((row[2]/row[1]*100), 2) if row[1] > 0 else 0
+        })
+    
+    cursor.execute("""
+        SELECT 
+            COUNT(*) as total_matches,
+            SUM(CASE WHEN winner_id = ? THEN 1 ELSE 0 END) as wins
+        FROM (
+            SELECT winner_id FROM matches WHERE player1_id = ? AND status = 'finished'
+            UNION ALL
+            SELECT winner_id FROM matches WHERE player2_id = ? AND status = 'finished'
+        )
+    """, (user_id, user_id, user_id))
+    
+    pvp_stats = cursor.fetchone()
+    total_matches = pvp_stats[0] or 0
+    wins = pvp_stats[1] or 0
+    
+    conn.close()
+    
+    return {
+        'id': user_id,
+        'username': user_info[0],
+        'rating': user_info[1],
+        'role': user_info[2],
+        'xp': user_info[3],
+        'level': user_info[4],
+        'stats': {
+            'total_problems': total,
+            'correct_answers': correct,
+            'accuracy': round((correct/total*100), 2) if total > 0 else 0,
+            'avg_time': round(avg_time, 2),
+            'pvp_matches': total_matches,
+            'pvp_wins': wins,
+            'pvp_winrate': round((wins/total_matches*100), 2) if total_matches > 0 else 0
+        },
+        'categories': categories
+    }
@@ -1,80 +1,472 @@
 import socket
+import selectors
 import threading
 import json
 import base64
 import hashlib
 import time
-import sqlite3
+import heapq
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    WS_HOST, WS_PORT, WS_BACKLOG, WS_MAX_CONNECTIONS, WS_LOOPS, WS_MAX_FRAME_SIZE, WS_MAX_MESSAGE_SIZE,
+    WS_MAX_QUEUED_MESSAGES, WS_MAX_QUEUED_BYTES, WS_OVERFLOW_POLICY,
+    WS_PING_INTERVAL, WS_IDLE_TIMEOUT, WS_HANDSHAKE_TIMEOUT, WS_REAP_INTERVAL,
+    WS_RATE_LIMIT, WS_RATE_BURST, WS_BATCH_WINDOW, WS_BATCH_MAX_MESSAGES, WS_AUTH_WORKERS,
+    WS_DEFLATE_ENABLED, WS_DEFLATE_WINDOW_BITS, WS_DEFLATE_CONTEXT_TAKEOVER, WS_DEFLATE_MIN_SIZE, WS_DEFLATE_LEVEL
+)
+from user_cache import user_profiles
+from rate_limit import TokenBucket
+from stats_feed import StatsPublisher
+from rooms import RoomRegistry, match_room, user_room, stats_room, LOBBY_ROOM
+from lobby import lobby
+from broadcast_bus import LocalBus
+from ws_frames import (
+    FrameDecoder, ProtocolError, encode_frame, encode_close, negotiate_deflate,
+    OP_TEXT, OP_CLOSE, OP_PING, OP_PONG, CLOSE_NORMAL, CLOSE_INVALID_DATA
+)
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_HANDSHAKE_SIZE = 8192
+RECV_SIZE = 65536
+
+
+class OutboundMessage:
+    # A text message queued for one or more clients. It is framed (and
+    # compressed) by the loop that writes it, so the per-connection deflate
+    # context always sees messages in the order they go out on the wire.
+    def __init__(self, payload):
+        self.payload = payload
+        self.plain_frame = None
+        self.shared_frames = {}
+
+    def __len__(self):
+        return len(self.payload)
+
+    def frame_for(self, conn):
+        deflate = conn.deflate
+        if deflate is None or len(self.payload) < WS_DEFLATE_MIN_SIZE:
+            if self.plain_frame is None:
+                self.plain_frame = encode_frame(OP_TEXT, self.payload)
+            return self.plain_frame
+        if deflate.context_takeover:
+            return encode_frame(OP_TEXT, deflate.compress(self.payload), rsv1=True)
+        frame = self.shared_frames.get(deflate.window_bits)
+        if frame is None:
+            frame = encode_frame(OP_TEXT, deflate.compress(self.payload), rsv1=True)
+            self.shared_frames[deflate.window_bits] = frame
+        return frame
+
+
+class ClientConnection:
+    def __init__(self, sock, addr, loop):
+        self.sock = sock
+        self.addr = addr
+        self.loop = loop
+        self.inbuf = bytearray()
+        self.decoder = FrameDecoder(WS_MAX_FRAME_SIZE, WS_MAX_MESSAGE_SIZE)
+        self.deflate = None
+        self.outqueue = deque()
+        self.queued_bytes = 0
+        self.head_offset = 0
+        self.out_lock = threading.Lock()
+        self.handshake_done = False
+        self.connected_at = self.last_seen = time.monotonic()
+        self.ping_sent = False
+        self.limiter = TokenBucket(WS_RATE_LIMIT, WS_RATE_BURST)
+        self.throttled = False
+        self.writing = False
+        self.closing = False
+        self.closed = False
+        # Messages received while an auth lookup is in flight, None otherwise
+        self.pending = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class EventLoop:
+    def __init__(self, server, index):
+        self.server = server
+        self.index = index
+        self.selector = selectors.DefaultSelector()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, None)
+        self.callbacks = deque()
+        self.timers = []
+        self.timer_ids = itertools.count()
+        self.connections = set()
+        self.thread = None
+
+    def call_soon(self, callback, *args):
+        self.callbacks.append((callback, args))
+        if threading.current_thread() is not self.thread:
+            try:
+                self.wake_writer.send(b'\0')
+            except (BlockingIOError, OSError):
+                pass
+
+    def call_later(self, delay, callback, *args):
+        self.call_soon(self.add_timer, time.monotonic() + delay, callback, args)
+
+    def add_timer(self, when, callback, args):
+        heapq.heappush(self.timers, (when, next(self.timer_ids), callback, args))
+
+    def run(self):
+        self.thread = threading.current_thread()
+        self.add_timer(time.monotonic() + WS_REAP_INTERVAL, self.reap, ())
+        while True:
+            timeout = max(0, self.timers[0][0] - time.monotonic()) if self.timers else None
+            for key, mask in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                elif key.data == 'listen':
+                    self.server.accept_clients(key.fileobj)
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.handle_read(conn)
+                    if mask & selectors.EVENT_WRITE and not conn.closed:
+                        self.handle_write(conn)
+
+            while self.callbacks:
+                callback, args = self.callbacks.popleft()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"WebSocket loop error: {e}")
+
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now:
+                _, _, callback, args = heapq.heappop(self.timers)
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"WebSocket loop error: {e}")
+
+    def reap(self):
+        now = time.monotonic()
+        self.check_heartbeats(now)
+        self.add_timer(now + WS_REAP_INTERVAL, self.reap, ())
+
+    def check_heartbeats(self, now):
+        dead = []
+        for conn in self.connections:
+            if not conn.handshake_done:
+                if now - conn.connected_at > WS_HANDSHAKE_TIMEOUT:
+                    dead.append(conn)
+            elif now - conn.last_seen > WS_IDLE_TIMEOUT:
+                dead.append(conn)
+            elif now - conn.last_seen > WS_PING_INTERVAL and not conn.ping_sent:
+                conn.ping_sent = True
+                self.server.pings_sent += 1
+                self.queue_send(conn, encode_frame(OP_PING, b''))
+
+        if dead:
+            self.server.reaped_connections += len(dead)
+            for conn in dead:
+                self.close_connection(conn)
+
+    def add_listener(self, sock):
+        self.selector.register(sock, selectors.EVENT_READ, 'listen')
+
+    def add_connection(self, conn):
+        self.connections.add(conn)
+        self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+
+    def handle_read(self, conn):
+        try:
+            data = conn.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            self.close_connection(conn)
+            return
+        conn.last_seen = time.monotonic()
+        conn.ping_sent = False
+        if conn.closing:
+            return
+
+        try:
+            if conn.handshake_done:
+                conn.decoder.feed(data)
+            else:
+                conn.inbuf += data
+                self.server.handle_handshake(conn)
+            if conn.handshake_done:
+                self.server.handle_frames(conn)
+        except ProtocolError as e:
+            self.queue_send(conn, encode_close(e.close_code, str(e)), close=True)
+        except Exception as e:
+            print(f"WebSocket error: {e}")
+            self.close_connection(conn)
+
+    def handle_write(self, conn):
+        failed = False
+        with conn.out_lock:
+            queue = conn.outqueue
+            try:
+                while queue:
+                    head = queue[0]
+                    if isinstance(head, OutboundMessage):
+                        head = self.frame_batch(conn)
+                    sent = conn.sock.send(memoryview(head)[conn.head_offset:])
+                    conn.head_offset += sent
+                    if conn.head_offset < len(head):
+                        return
+                    queue.popleft()
+                    conn.queued_bytes -= len(head)
+                    conn.head_offset = 0
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                failed = True
+            conn.writing = False
+
+        if failed or conn.closing:
+            self.close_connection(conn)
+        else:
+            self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+
+    def frame_batch(self, conn):
+        # Frames the events at the head of the queue, merging consecutive
+        # ones into a single JSON array
+        queue = conn.outqueue
+        batch = [queue.popleft()]
+        while queue and len(batch) < WS_BATCH_MAX_MESSAGES and isinstance(queue[0], OutboundMessage):
+            batch.append(queue.popleft())
+        if len(batch) == 1:
+            frame = batch[0].frame_for(conn)
+        else:
+            frame = OutboundMessage(b'[' + b','.join(message.payload for message in batch) + b']').frame_for(conn)
+            self.server.batched_messages += len(batch)
+        queue.appendleft(frame)
+        conn.queued_bytes += len(frame) - sum(len(message) for message in batch)
+        return frame
+
+    def queue_send(self, conn, data, close=False):
+        with conn.out_lock:
+            if conn.closed or conn.closing:
+                return True
+            queue = conn.outqueue
+            if not close and (len(queue) >= WS_MAX_QUEUED_MESSAGES
+                              or conn.queued_bytes + len(data) > WS_MAX_QUEUED_BYTES):
+                if WS_OVERFLOW_POLICY != 'coalesce':
+                    conn.closing = True
+                    self.server.overflow_drops += 1
+                    self.call_soon(self.close_connection, conn)
+                    return False
+                # Keep the frame currently being written, drop the oldest ones after it
+                while len(queue) > 1 and (len(queue) >= WS_MAX_QUEUED_MESSAGES
+                                          or conn.queued_bytes + len(data) > WS_MAX_QUEUED_BYTES):
+                    dropped = queue[1]
+                    del queue[1]
+                    conn.queued_bytes -= len(dropped)
+                    self.server.coalesced_messages += 1
+            queue.append(data)
+            conn.queued_bytes += len(data)
+            if close:
+                conn.closing = True
+            if conn.writing:
+                return True
+            conn.writing = True
+        if WS_BATCH_WINDOW and isinstance(data, OutboundMessage):
+            # Hold events briefly so the ones that follow go out in the same frame
+            self.call_later(WS_BATCH_WINDOW, self.start_writing, conn)
+        else:
+            self.call_soon(self.start_writing, conn)
+        return True
+
+    def start_writing(self, conn):
+        if not conn.closed:
+            self.selector.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+
+    def close_connection(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        self.connections.discard(conn)
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        self.server.remove_client(conn)
 
-from config import DB_FILE
 
 class WebSocketServer:
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host=WS_HOST, port=WS_PORT, loops=WS_LOOPS, bus=None, reuse_port=False):
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port
         self.clients = {}
-        self.match_broadcasters = {}
-        
+        self.rooms = RoomRegistry()
+        self.lock = threading.Lock()
+        self.overflow_drops = 0
+        self.coalesced_messages = 0
+        self.pings_sent = 0
+        self.reaped_connections = 0
+        self.rate_limited = 0
+        self.batched_messages = 0
+        self.stats_feed = StatsPublisher(self)
+        self.auth_executor = ThreadPoolExecutor(max_workers=WS_AUTH_WORKERS, thread_name_prefix='ws-auth')
+        self.bus = bus or LocalBus()
+        self.bus.subscribe('room', self.on_room_message)
+        self.bus.subscribe('stats', self.on_stats_message)
+        self.loops = [EventLoop(self, index) for index in range(max(1, loops))]
+        self.next_loop = 0
+        self.connection_count = 0
+
     def start(self):
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         server.bind((self.host, self.port))
-        server.listen(5)
+        server.listen(WS_BACKLOG)
+        server.setblocking(False)
         print(f"🔥 WebSocket сервер запущен на ws://{self.host}:{self.port}")
-        
+
+        self.stats_feed.start()
+
+        self.loops[0].add_listener(server)
+        for loop in self.loops[1:]:
+            threading.Thread(target=loop.run, daemon=True).start()
+        self.loops[0].run()
+
+    def accept_clients(self, server):
         while True:
-            client, addr = server.accept()
-            threading.Thread(target=self.handle_client, args=(client,)).start()
-    
-    def handle_client(self, client):
-        try:
-            data = client.recv(1024).decode()
-            if 'Sec-WebSocket-Key' in data:
-                key_line = [line for line in data.split('\r\n') if 'Sec-WebSocket-Key:' in line][0]
-                key = key_line.split(': ')[1]
-                
-                accept_key = base64.b64encode(
-                    hashlib.sha1((key + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode()).digest()
-                ).decode()
-                
-                response = (
-                    "HTTP/1.1 101 Switching Protocols\r\n"
-                    "Upgrade: websocket\r\n"
-                    "Connection: Upgrade\r\n"
-                    f"Sec-WebSocket-Accept: {accept_key}\r\n\r\n"
-                )
-                client.send(response.encode())
-                
-                while True:
-                    try:
-                        msg = self.receive_message(client)
-                        if msg:
-                            self.process_message(client, msg)
-                    except:
-                        break
-        except Exception as e:
-            print(f"WebSocket error: {e}")
-        finally:
-            self.remove_client(client)
-    
+            try:
+                client, addr = server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"WebSocket accept error: {e}")
+                return
+
+            with self.lock:
+                if self.connection_count >= WS_MAX_CONNECTIONS:
+                    client.close()
+                    continue
+                self.connection_count += 1
+
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            loop = self.loops[self.next_loop]
+            self.next_loop = (self.next_loop + 1) % len(self.loops)
+            loop.call_soon(loop.add_connection, ClientConnection(client, addr, loop))
+
+    def handle_handshake(self, client):
+        end = client.inbuf.find(b'\r\n\r\n')
+        if end < 0:
+            if len(client.inbuf) > MAX_HANDSHAKE_SIZE:
+                raise ValueError('handshake too large')
+            return
+
+        request = client.inbuf[:end].decode('latin-1')
+        del client.inbuf[:end + 4]
+
+        headers = {}
+        for line in request.split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        key = headers.get('sec-websocket-key')
+        if not key:
+            raise ValueError('missing Sec-WebSocket-Key')
+
+        accept_key = base64.b64encode(
+            hashlib.sha1((key + WS_GUID).encode()).digest()
+        ).decode()
+
+        extensions = ''
+        if WS_DEFLATE_ENABLED:
+            extension, deflate = negotiate_deflate(
+                headers.get('sec-websocket-extensions'),
+                WS_DEFLATE_WINDOW_BITS, WS_DEFLATE_CONTEXT_TAKEOVER, WS_DEFLATE_LEVEL
+            )
+            if deflate:
+                client.deflate = client.decoder.deflate = deflate
+                extensions = f"Sec-WebSocket-Extensions: {extension}\r\n"
+
+        response = (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept_key}\r\n"
+            f"{extensions}\r\n"
+        )
+        client.handshake_done = True
+        client.loop.queue_send(client, response.encode())
+        if client.inbuf:
+            client.decoder.feed(client.inbuf)
+        client.inbuf = None
+
+    def handle_frames(self, client):
+        for opcode, payload in client.decoder.messages():
+            if opcode == OP_TEXT:
+                if not client.limiter.consume():
+                    self.rate_limited += 1
+                    if not client.throttled:
+                        client.throttled = True
+                        self.send_json(client, {'type': 'rate_limited'})
+                    continue
+                client.throttled = False
+                try:
+                    message = payload.decode('utf-8')
+                except UnicodeDecodeError:
+                    raise ProtocolError('invalid utf-8', CLOSE_INVALID_DATA)
+                self.process_message(client, message)
+            elif opcode == OP_PING:
+                client.loop.queue_send(client, encode_frame(OP_PONG, payload))
+            elif opcode == OP_CLOSE:
+                code = int.from_bytes(payload[:2], 'big') if len(payload) >= 2 else CLOSE_NORMAL
+                client.loop.queue_send(client, encode_close(code), close=True)
+                return
+            if client.closing or client.closed:
+                return
+
     def process_message(self, client, message):
+        if client.pending is not None:
+            # Handled in order once the auth lookup is done
+            client.pending.append(message)
+            return
         try:
             data = json.loads(message)
             msg_type = data.get('type')
-            
+
             if msg_type == 'auth':
-                user_id = data.get('user_id')
-                self.clients[client] = {'user_id': user_id}
+                client.pending = deque()
+                self.auth_executor.submit(self.lookup_profile, client, data.get('user_id'), data.get('match_id'))
+
+            elif msg_type in ('subscribe', 'unsubscribe'):
+                channel = data.get('channel')
+                if channel == 'stats':
+                    client_info = self.clients.get(client)
+                    profile = client_info.get('profile') if client_info else None
+                    user_id = profile['id'] if profile else None
+                    if msg_type == 'subscribe':
+                        self.stats_feed.subscribe(client, user_id)
+                    else:
+                        self.stats_feed.unsubscribe(client, user_id)
+                elif channel == 'lobby':
+                    if msg_type == 'subscribe':
+                        # Join before taking the snapshot so no delta falls in between
+                        self.rooms.join(LOBBY_ROOM, client)
+                        self.send_json(client, {'type': 'lobby', 'event': 'snapshot', 'matches': lobby.list()})
+                    else:
+                        self.rooms.leave(LOBBY_ROOM, client)
 
-                match_id = data.get('match_id')
-                if match_id:
-                    self.clients[client]['match_id'] = match_id
-
-                    if match_id not in self.match_broadcasters:
-                        self.match_broadcasters[match_id] = []
-                    if client not in self.match_broadcasters[match_id]:
-                        self.match_broadcasters[match_id].append(client)
-                
             elif msg_type == 'answer_submitted':
                 match_id = data.get('match_id')
                 user_id = data.get('user_id')
@@ -83,100 +475,129 @@ class WebSocketServer:
                     'user_id': user_id,
                     'timestamp': time.time()
                 }, exclude_client=client)
-                
+
             elif msg_type == 'chat':
                 match_id = data.get('match_id')
                 message = data.get('message')
+                client_info = self.clients.get(client)
+                if not client_info:
+                    return
                 self.broadcast_to_match(match_id, {
                     'type': 'chat',
-                    'user_id': self.clients[client]['user_id'],
+                    'user_id': client_info['user_id'],
                     'message': message,
                     'timestamp': time.time()
                 })
-                
+
         except json.JSONDecodeError:
             pass
-    
-    def broadcast_to_match(self, match_id, message, exclude_client=None):
-        if match_id in self.match_broadcasters:
-            msg_json = json.dumps(message)
-            for client_socket in self.match_broadcasters[match_id]:
-                if client_socket != exclude_client:
-                    try:
-                        self.send_message(client_socket, msg_json)
-                    except:
-                        pass
-    
-    def receive_message(self, client):
+
+    def lookup_profile(self, client, user_id, match_id):
+        # Runs on an auth worker: a cache miss reads the database
         try:
-            data = client.recv(2)
-            if len(data) < 2:
-                return None
-            
-            first_byte, second_byte = data[0], data[1]
-            masked = (second_byte & 0x80) != 0
-            payload_length = second_byte & 0x7F
-            
-            if payload_length == 126:
-                data += client.recv(2)
-                payload_length = int.from_bytes(data[2:4], 'big')
-            elif payload_length == 127:
-                data += client.recv(8)
-                payload_length = int.from_bytes(data[2:10], 'big')
-            
-            if masked:
-                mask_key = client.recv(4)
-                encoded = client.recv(payload_length)
-                decoded = bytes(encoded[i] ^ mask_key[i % 4] for i in range(len(encoded)))
-            else:
-                decoded = client.recv(payload_length)
-            
-            return decoded.decode('utf-8')
-        except:
-            return None
-    
+            profile = user_profiles.get(int(user_id))
+        except (TypeError, ValueError):
+            profile = None
+        except Exception as e:
+            print(f"⚠️ WebSocket auth lookup failed: {e}")
+            profile = None
+        client.loop.call_soon(self.authenticate, client, user_id, match_id, profile)
+
+    def authenticate(self, client, user_id, match_id, profile):
+        pending, client.pending = client.pending, None
+        if client.closed:
+            return
+
+        # The profile stays with the session, so teardown never needs the database
+        client_info = {'user_id': user_id, 'profile': profile}
+        with self.lock:
+            previous = self.clients.get(client)
+            self.clients[client] = client_info
+
+        if previous and previous.get('match_id'):
+            self.rooms.leave(match_room(previous['match_id']), client)
+        if previous and previous.get('profile'):
+            self.rooms.leave(user_room(previous['profile']['id']), client)
+        if profile:
+            self.rooms.join(user_room(profile['id']), client)
+        if match_id:
+            client_info['match_id'] = match_id
+            self.rooms.join(match_room(match_id), client)
+
+        for message in pending:
+            self.process_message(client, message)
+
+    def broadcast_to_match(self, match_id, message, exclude_client=None):
+        # Players of one match may be connected to different processes
+        room = match_room(match_id)
+        self.broadcast_to_room(room, message, exclude_client)
+        self.bus.forward('room', {'room': list(room), 'message': message})
+
+    def on_room_message(self, message):
+        self.broadcast_to_room(tuple(message['room']), message['message'])
+
+    def on_stats_message(self, message):
+        self.notify_stats_changed(*message['user_ids'])
+
+    def broadcast_to_room(self, room, message, exclude_client=None):
+        recipients = self.rooms.members(room)
+        if recipients:
+            outbound = OutboundMessage(json.dumps(message).encode('utf-8'))
+            for client in recipients:
+                if client is not exclude_client:
+                    client.loop.queue_send(client, outbound)
+
     def send_message(self, client, message):
+        client.loop.queue_send(client, OutboundMessage(message.encode('utf-8')))
+
+    def send_json(self, client, message):
+        self.send_message(client, json.dumps(message))
+
+    def publish_lobby_event(self, message):
+        self.broadcast_to_room(LOBBY_ROOM, message)
+
+    def notify_stats_changed(self, *user_ids):
+        if user_ids:
+            self.stats_feed.users_changed(*user_ids)
+        else:
+            self.stats_feed.platform_changed()
+
+    def remove_client(self, client):
+        with self.lock:
+            self.connection_count -= 1
+            client_info = self.clients.pop(client, None)
+        self.rooms.leave_all(client)
+        match_id = client_info.get('match_id') if client_info else None
+
+        if match_id:
+            profile = client_info.get('profile')
+            self.broadcast_to_match(match_id, {
+                'type': 'player_left',
+                'user_id': client_info['user_id'],
+                'username': profile['username'] if profile else None,
+                'timestamp': time.time()
+            })
+
         try:
-            header = bytearray()
-            header.append(0x81)
-            
-            msg_bytes = message.encode('utf-8')
-            length = len(msg_bytes)
-            
-            if length <= 125:
-                header.append(length)
-            elif length <= 65535:
-                header.append(126)
-                header.extend(length.to_bytes(2, 'big'))
-            else:
-                header.append(127)
-                header.extend(length.to_bytes(8, 'big'))
-            
-            client.send(header + msg_bytes)
-        except:
+            client.sock.close()
+        except OSError:
             pass
-    
-    def remove_client(self, client):
-        if client in self.clients:
-            client_info = self.clients[client]
-            match_id = client_info.get('match_id')
-            
-            if match_id and match_id in self.match_broadcasters:
-                if client in self.match_broadcasters[match_id]:
-                    self.match_broadcasters[match_id].remove(client)
-                
-                conn = sqlite3.connect(DB_FILE)
-                cursor = conn.cursor()
-                cursor.execute("SELECT username FROM users WHERE id = ?", (client_info['user_id'],))
-                username = cursor.fetchone()[0]
-                conn.close()
 
-                self.broadcast_to_match(match_id, {
-                    'type': 'player_left',
-                    'user_id': client_info['user_id'],
-                    'username': username,
-                    'timestamp': time.time()
-                })
-            
-            del self.clients[client]
-        client.close()
+    def stats(self):
+        with self.lock:
+            return {
+                'connections': self.connection_count,
+                'authenticated': len(self.clients),
+                'match_rooms': self.rooms.count('match'),
+                'loops': len(self.loops),
+                'overflow_drops': self.overflow_drops,
+                'coalesced_messages': self.coalesced_messages,
+                'pings_sent': self.pings_sent,
+                'reaped_connections': self.reaped_connections,
+                'rate_limited': self.rate_limited,
+                'batched_messages': self.batched_messages,
+                'stats_subscribers': len(self.rooms.members(stats_room())),
+                'stats_published': self.stats_feed.published,
+                'lobby_subscribers': len(self.rooms.members(LOBBY_ROOM)),
+                'user_cache': user_profiles.stats()
+            }
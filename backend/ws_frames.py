@@ -0,0 +1,250 @@
+import struct
+import zlib
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_INVALID_DATA = 1007
+CLOSE_TOO_BIG = 1009
+
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+class ProtocolError(Exception):
+    def __init__(self, message, close_code=CLOSE_PROTOCOL_ERROR):
+        super().__init__(message)
+        self.close_code = close_code
+
+
+def unmask(payload, mask_key):
+    # XOR the whole payload as one big integer instead of byte by byte
+    length = len(payload)
+    if not length:
+        return b''
+    mask = (mask_key * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(mask, 'little')).to_bytes(length, 'little')
+
+
+def encode_frame(opcode, payload, fin=True, rsv1=False):
+    first_byte = (0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode
+    length = len(payload)
+
+    if length <= 125:
+        header = struct.pack('!BB', first_byte, length)
+    elif length <= 65535:
+        header = struct.pack('!BBH', first_byte, 126, length)
+    else:
+        header = struct.pack('!BBQ', first_byte, 127, length)
+
+    return header + payload
+
+
+def encode_close(code=CLOSE_NORMAL, reason=''):
+    return encode_frame(OP_CLOSE, struct.pack('!H', code) + reason.encode('utf-8')[:123])
+
+
+class PerMessageDeflate:
+    # permessage-deflate (RFC 7692) state of one connection
+    def __init__(self, window_bits, context_takeover, level):
+        # zlib cannot produce raw deflate streams with an 8-bit window
+        self.window_bits = max(9, window_bits)
+        self.context_takeover = context_takeover
+        self.level = level
+        self.compressor = self.new_compressor() if context_takeover else None
+        self.decompressor = zlib.decompressobj(-15)
+
+    def new_compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -self.window_bits)
+
+    def compress(self, payload):
+        compressor = self.compressor or self.new_compressor()
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4] if data.endswith(DEFLATE_TAIL) else data
+
+    def decompress(self, payload, max_size):
+        try:
+            data = self.decompressor.decompress(payload + DEFLATE_TAIL, max_size)
+        except zlib.error:
+            raise ProtocolError('invalid compressed data', CLOSE_INVALID_DATA)
+        if self.decompressor.unconsumed_tail:
+            raise ProtocolError('message too large', CLOSE_TOO_BIG)
+        return data
+
+
+DEFLATE_PARAMS = (
+    'server_max_window_bits', 'client_max_window_bits',
+    'server_no_context_takeover', 'client_no_context_takeover'
+)
+
+
+def parse_extensions(header):
+    # Returns (name, [(param, value), ...]) per offer; params keep their order
+    # and duplicates so the negotiation can reject them
+    offers = []
+    for offer in (header or '').split(','):
+        parts = [part.strip() for part in offer.split(';')]
+        if not parts[0]:
+            continue
+        params = []
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            params.append((name.strip().lower(), value.strip().strip('"') or None))
+        offers.append((parts[0].lower(), params))
+    return offers
+
+
+def window_bits_param(value, required):
+    # Returns the window size of a *_max_window_bits value, or None when invalid
+    if value is None:
+        return None if required else 15
+    if not value.isdigit() or not 8 <= int(value) <= 15:
+        return None
+    return int(value)
+
+
+def negotiate_deflate(header, window_bits, context_takeover, level):
+    # Returns (Sec-WebSocket-Extensions response value, PerMessageDeflate),
+    # or (None, None) when the client did not offer an acceptable configuration.
+    # Offers with unknown, duplicate or invalid parameters are declined (RFC 7692 section 7).
+    for name, param_list in parse_extensions(header):
+        if name != 'permessage-deflate':
+            continue
+        params = dict(param_list)
+        if len(params) != len(param_list) or any(param not in DEFLATE_PARAMS for param in params):
+            continue
+        if 'client_max_window_bits' in params and window_bits_param(params['client_max_window_bits'], False) is None:
+            continue
+        if params.get('server_no_context_takeover') or params.get('client_no_context_takeover'):
+            continue
+
+        response = ['permessage-deflate']
+        bits = window_bits
+        if 'server_max_window_bits' in params:
+            offered = window_bits_param(params['server_max_window_bits'], True)
+            # zlib cannot compress with an 8 bit window, so such offers are declined
+            if offered is None or offered < 9:
+                continue
+            bits = min(bits, offered)
+            response.append(f'server_max_window_bits={bits}')
+
+        takeover = context_takeover and 'server_no_context_takeover' not in params
+        if not takeover:
+            response.append('server_no_context_takeover')
+        if 'client_no_context_takeover' in params:
+            response.append('client_no_context_takeover')
+
+        return '; '.join(response), PerMessageDeflate(bits, takeover, level)
+    return None, None
+
+
+class FrameDecoder:
+    def __init__(self, max_frame_size, max_message_size):
+        self.max_frame_size = max_frame_size
+        self.max_message_size = max_message_size
+        self.buffer = bytearray()
+        self.fragments = []
+        self.fragment_opcode = None
+        self.fragment_size = 0
+        self.fragment_compressed = False
+        self.deflate = None
+
+    def feed(self, data):
+        self.buffer += data
+
+    def messages(self):
+        # Yields (opcode, payload) for every complete control frame and
+        # every fully reassembled data message in the buffer.
+        buffer = self.buffer
+        offset = 0
+        try:
+            while True:
+                available = len(buffer) - offset
+                if available < 2:
+                    return
+
+                first_byte, second_byte = buffer[offset], buffer[offset + 1]
+                fin = first_byte & 0x80
+                opcode = first_byte & 0x0F
+                length = second_byte & 0x7F
+                header_size = 2
+
+                rsv1 = first_byte & 0x40
+                if first_byte & 0x30 or (rsv1 and (self.deflate is None or opcode not in (OP_TEXT, OP_BINARY))):
+                    raise ProtocolError('reserved bits set')
+                if not second_byte & 0x80:
+                    raise ProtocolError('client frames must be masked')
+
+                if length == 126:
+                    if available < 4:
+                        return
+                    length = struct.unpack_from('!H', buffer, offset + 2)[0]
+                    header_size = 4
+                elif length == 127:
+                    if available < 10:
+                        return
+                    length = struct.unpack_from('!Q', buffer, offset + 2)[0]
+                    header_size = 10
+
+                if opcode >= 0x8:
+                    if not fin or length > 125:
+                        raise ProtocolError('invalid control frame')
+                elif length > self.max_frame_size:
+                    raise ProtocolError('frame too large', CLOSE_TOO_BIG)
+
+                frame_end = offset + header_size + 4 + length
+                if len(buffer) < frame_end:
+                    return
+
+                mask_key = bytes(buffer[offset + header_size:offset + header_size + 4])
+                payload = unmask(bytes(buffer[offset + header_size + 4:frame_end]), mask_key)
+                offset = frame_end
+
+                if opcode >= 0x8:
+                    yield opcode, payload
+                    continue
+
+                message = self.add_fragment(fin, opcode, payload, rsv1)
+                if message is not None:
+                    yield message
+        finally:
+            del buffer[:offset]
+
+    def add_fragment(self, fin, opcode, payload, compressed):
+        if opcode == OP_CONTINUATION:
+            if self.fragment_opcode is None:
+                raise ProtocolError('unexpected continuation frame')
+        elif opcode in (OP_TEXT, OP_BINARY):
+            if self.fragment_opcode is not None:
+                raise ProtocolError('expected continuation frame')
+            if fin:
+                if compressed:
+                    payload = self.deflate.decompress(payload, self.max_message_size)
+                return opcode, payload
+            self.fragment_opcode = opcode
+            self.fragment_compressed = bool(compressed)
+        else:
+            raise ProtocolError('unknown opcode')
+
+        self.fragment_size += len(payload)
+        if self.fragment_size > self.max_message_size:
+            raise ProtocolError('message too large', CLOSE_TOO_BIG)
+        self.fragments.append(payload)
+
+        if not fin:
+            return None
+
+        payload = b''.join(self.fragments)
+        if self.fragment_compressed:
+            payload = self.deflate.decompress(payload, self.max_message_size)
+        message = (self.fragment_opcode, payload)
+        self.fragments = []
+        self.fragment_opcode = None
+        self.fragment_size = 0
+        self.fragment_compressed = False
+        return message
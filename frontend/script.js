@@ -2,9 +2,15 @@ let ws = null;
 let currentUser = null;
 let currentMatch = null;
 let wsConnected = false;
-let statsRefreshInterval = null;
+let statsSubscribed = false;
+let lobbySubscribed = false;
+let lobbyMatches = new Map();
+let matchmakingActive = false;
 
 async function loadComponent(id, url) {
+    
+    if (document.getElementById(id).childElementCount > 0) return;
+
     const response = await fetch(url);
     const text = await response.text();
     document.getElementById(id).innerHTML = text;
@@ -54,9 +60,11 @@ function showNotification(message, type = 'info') {
 
 function showPanel(panelId) {
     
-    if (statsRefreshInterval) {
-        clearInterval(statsRefreshInterval);
-        statsRefreshInterval = null;
+    if (panelId !== 'stats') {
+        unsubscribeStats();
+    }
+    if (panelId !== 'pvp') {
+        unsubscribeLobby();
     }
 
     document.querySelectorAll('.content-panel').forEach(panel => {
@@ -89,15 +97,13 @@ function showPanel(panelId) {
             loadProblems();
             break;
         case 'stats':
-            loadStats();
-            
-            statsRefreshInterval = setInterval(loadStats, 5000);
+            subscribeStats();
             break;
         case 'leaderboard':
             loadLeaderboard();
             break;
         case 'pvp':
-            loadActiveMatches();
+            subscribeLobby();
             break;
         case 'profile':
             loadProfile();
@@ -206,10 +212,9 @@ function logout() {
         wsConnected = false;
     }
 
-    if (statsRefreshInterval) {
-        clearInterval(statsRefreshInterval);
-        statsRefreshInterval = null;
-    }
+    statsSubscribed = false;
+    lobbySubscribed = false;
+    setMatchmakingActive(false);
 
     document.getElementById('authPanel').classList.add('active');
     document.getElementById('navTabs').style.display = 'none';
@@ -386,10 +391,7 @@ async function loadStats() {
         const statsData = await statsResponse.json();
 
         if (statsData.success) {
-            document.getElementById('totalUsers').textContent = statsData.stats.users_count;
-            document.getElementById('totalProblems').textContent = statsData.stats.problems_count;
-            document.getElementById('correctSolutions').textContent = statsData.stats.correct_solutions;
-            document.getElementById('matchesPlayed').textContent = statsData.stats.matches_played;
+            renderPlatformStats(statsData.stats);
         } else {
             showNotification('Ошибка загрузки общей статистики платформы', 'error');
             
@@ -406,44 +408,7 @@ async function loadStats() {
             const userStatsData = await userStatsResponse.json();
 
             if (userStatsData.success) {
-                const user = userStatsData.user;
-                
-                currentUser.rating = user.rating;
-                document.getElementById('userRating').textContent = user.rating;
-
-                userStatsContainer.innerHTML = `
-                <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 15px;">
-                <div style="text-align: center;">
-                <div style="font-size: 1.8em; color: var(--primary-color); font-weight: bold;">${user.stats.total_problems}</div>
-                <div style="color: var(--text-muted);">Всего решено</div>
-                </div>
-                <div style="text-align: center;">
-                <div style="font-size: 1.8em; color: var(--secondary-color); font-weight: bold;">${user.stats.correct_answers}</div>
-                <div style="color: var(--text-muted);">Правильно</div>
-                </div>
-                <div style="text-align: center;">
-                <div style="font-size: 1.8em; color: var(--accent-color); font-weight: bold;">${user.stats.accuracy}%</div>
-                <div style="color: var(--text-muted);">Точность</div>
-                </div>
-                <div style="text-align: center;">
-                <div style="font-size: 1.8em; color: var(--text-color); font-weight: bold;">${user.stats.avg_time}s</div>
-                <div style="color: var(--text-muted);">Среднее время</div>
-                </div>
-                </div>
-                ${user.categories.length > 0 ? `
-                    <h4 style="color: var(--text-muted); margin: 25px 0 12px 0;">По категориям:</h4>
-                    <div style="display: flex; flex-direction: column; gap: 8px;">
-                    ${user.categories.map(cat => `
-                        <div style="background: rgba(var(--primary-color-rgb), 0.1); padding: 8px 12px; border-radius: 6px; border-left: 3px solid var(--primary-color);">
-                        <div style="display: flex; justify-content: space-between;">
-                        <span>${cat.category}</span>
-                        <span>${cat.correct}/${cat.total} (${cat.total > 0 ? Math.round(cat.correct/cat.total*100) : 0}%)</span>
-                        </div>
-                        </div>
-                        `).join('')}
-                        </div>
-                        ` : ''}
-                        `;
+                renderUserStats(userStatsData.user);
             } else {
                 userStatsContainer.innerHTML = `
                 <div style="text-align: center; padding: 30px; color: var(--text-muted);">
@@ -465,6 +430,73 @@ async function loadStats() {
 }
 
 
+function renderPlatformStats(stats) {
+    document.getElementById('totalUsers').textContent = stats.users_count;
+    document.getElementById('totalProblems').textContent = stats.problems_count;
+    document.getElementById('correctSolutions').textContent = stats.correct_solutions;
+    document.getElementById('matchesPlayed').textContent = stats.matches_played;
+}
+
+function renderUserStats(user) {
+    const userStatsContainer = document.getElementById('userStats');
+
+    currentUser.rating = user.rating;
+    document.getElementById('userRating').textContent = user.rating;
+
+    userStatsContainer.innerHTML = `
+    <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap: 15px;">
+    <div style="text-align: center;">
+    <div style="font-size: 1.8em; color: var(--primary-color); font-weight: bold;">${user.stats.total_problems}</div>
+    <div style="color: var(--text-muted);">Всего решено</div>
+    </div>
+    <div style="text-align: center;">
+    <div style="font-size: 1.8em; color: var(--secondary-color); font-weight: bold;">${user.stats.correct_answers}</div>
+    <div style="color: var(--text-muted);">Правильно</div>
+    </div>
+    <div style="text-align: center;">
+    <div style="font-size: 1.8em; color: var(--accent-color); font-weight: bold;">${user.stats.accuracy}%</div>
+    <div style="color: var(--text-muted);">Точность</div>
+    </div>
+    <div style="text-align: center;">
+    <div style="font-size: 1.8em; color: var(--text-color); font-weight: bold;">${user.stats.avg_time}s</div>
+    <div style="color: var(--text-muted);">Среднее время</div>
+    </div>
+    </div>
+    ${user.categories.length > 0 ? `
+        <h4 style="color: var(--text-muted); margin: 25px 0 12px 0;">По категориям:</h4>
+        <div style="display: flex; flex-direction: column; gap: 8px;">
+        ${user.categories.map(cat => `
+            <div style="background: rgba(var(--primary-color-rgb), 0.1); padding: 8px 12px; border-radius: 6px; border-left: 3px solid var(--primary-color);">
+            <div style="display: flex; justify-content: space-between;">
+            <span>${cat.category}</span>
+            <span>${cat.correct}/${cat.total} (${cat.total > 0 ? Math.round(cat.correct/cat.total*100) : 0}%)</span>
+            </div>
+            </div>
+            `).join('')}
+            </div>
+            ` : ''}
+            `;
+}
+
+function subscribeStats() {
+    
+    if (!ws || !wsConnected) {
+        loadStats();
+        return;
+    }
+    if (!statsSubscribed) {
+        statsSubscribed = true;
+        ws.send(JSON.stringify({ type: 'subscribe', channel: 'stats' }));
+    }
+}
+
+function unsubscribeStats() {
+    if (statsSubscribed && ws && wsConnected) {
+        ws.send(JSON.stringify({ type: 'unsubscribe', channel: 'stats' }));
+    }
+    statsSubscribed = false;
+}
+
 async function loadLeaderboard() {
     const tbody = document.getElementById('leaderboardBody');
     tbody.innerHTML = `
@@ -538,6 +570,11 @@ function renderLeaderboard(leaderboard) {
 
 
 async function loadActiveMatches() {
+    
+    if (lobbySubscribed) {
+        return;
+    }
+
     try {
         const response = await fetch('/api/matches');
         const data = await response.json();
@@ -595,6 +632,44 @@ function renderActiveMatches(matches) {
         `).join('');
 }
 
+function subscribeLobby() {
+    if (!ws || !wsConnected) {
+        loadActiveMatches();
+        return;
+    }
+    if (!lobbySubscribed) {
+        lobbySubscribed = true;
+        ws.send(JSON.stringify({ type: 'subscribe', channel: 'lobby' }));
+    }
+}
+
+function unsubscribeLobby() {
+    if (lobbySubscribed && ws && wsConnected) {
+        ws.send(JSON.stringify({ type: 'unsubscribe', channel: 'lobby' }));
+    }
+    lobbySubscribed = false;
+}
+
+function applyLobbyEvent(data) {
+    switch(data.event) {
+        case 'snapshot':
+            lobbyMatches = new Map(data.matches.map(match => [match.id, match]));
+            break;
+        case 'match_created':
+        case 'match_joined':
+            lobbyMatches.set(data.match.id, data.match);
+            break;
+        case 'match_finished':
+            lobbyMatches.delete(data.match_id);
+            break;
+    }
+
+    const matches = Array.from(lobbyMatches.values()).sort((a, b) =>
+        (b.started_at || '').localeCompare(a.started_at || '') || b.id - a.id
+    );
+    renderActiveMatches(matches.slice(0, 20));
+}
+
 async function createMatch() {
     if (!currentUser) {
         showNotification('Войдите в систему', 'error');
@@ -625,6 +700,45 @@ async function createMatch() {
     }
 }
 
+function setMatchmakingActive(active) {
+    matchmakingActive = active;
+    const button = document.getElementById('findMatchButton');
+    if (button) {
+        button.innerHTML = active ? '<i class="fas fa-times"></i> Отменить поиск' : '<i class="fas fa-search"></i> Найти соперника';
+    }
+}
+
+async function findMatch() {
+    if (!currentUser) {
+        showNotification('Войдите в систему', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/match/queue', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                user_id: currentUser.id,
+                action: matchmakingActive ? 'dequeue' : 'enqueue'
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'info');
+            setMatchmakingActive(data.queued);
+            // When matched right away the match_started event sets up the match
+        } else {
+            showNotification(data.error, 'error');
+        }
+    } catch (error) {
+        console.error('Matchmaking error:', error);
+        showNotification('Ошибка поиска соперника', 'error');
+    }
+}
+
 async function joinMatch(matchId) {
     if (!currentUser) {
         showNotification('Войдите в систему', 'error');
@@ -945,6 +1059,16 @@ async function setupCurrentMatch(matchId) {
                     </button>
                     </div>
                     `;
+            } else if (match.status === 'expired') {
+                matchContent = `
+                <div style="text-align: center; padding: 50px; color: var(--text-muted);">
+                <i class="fas fa-hourglass-end" style="font-size: 3em; margin-bottom: 20px;"></i>
+                <p>Матч #${match.id} отменен: ${match.player2 ? 'никто не ответил вовремя' : 'соперник не найден'}.</p>
+                <button class="neon-button purple" onclick="showPanel('pvp')" style="margin-top: 20px;">
+                <i class="fas fa-redo"></i> К списку матчей
+                </button>
+                </div>
+                `;
             } else {
                 matchContent = `
                 <div style="text-align: center; padding: 50px; color: var(--text-muted);">
@@ -1216,12 +1340,23 @@ function connectWebSocket() {
                     match_id: currentMatch ? currentMatch.id : null 
                 }));
             }
+
+            if (document.getElementById('statsPanel').classList.contains('active')) {
+                subscribeStats();
+            }
+            if (document.getElementById('pvpPanel').classList.contains('active')) {
+                subscribeLobby();
+            }
         };
 
         ws.onmessage = async (event) => {
             try {
                 const data = JSON.parse(event.data);
-                await handleWebSocketMessage(data);
+                // Events sent close together arrive batched in one array
+                const messages = Array.isArray(data) ? data : [data];
+                for (const message of messages) {
+                    await handleWebSocketMessage(message);
+                }
             } catch (error) {
                 console.error('WebSocket message error:', error);
             }
@@ -1233,6 +1368,8 @@ function connectWebSocket() {
 
         ws.onclose = () => {
             wsConnected = false;
+            statsSubscribed = false;
+            lobbySubscribed = false;
             console.log('WebSocket disconnected');
             setTimeout(connectWebSocket, 5000);
         };
@@ -1248,6 +1385,7 @@ async function handleWebSocketMessage(data) {
 
             
             if (currentUser && (data.player1_id === currentUser.id || data.player2_id === currentUser.id)) {
+                setMatchmakingActive(false);
                 currentMatch = { id: data.match_id };
                 await setupCurrentMatch(data.match_id);
             }
@@ -1267,17 +1405,57 @@ async function handleWebSocketMessage(data) {
             break;
 
         case 'match_finished':
-            showNotification(`Матч #${data.match_id} завершен!`, 'success');
+            if (data.expired) {
+                showNotification(`Время матча #${data.match_id} истекло${data.forfeit ? ': победа присуждена ответившему игроку' : ', ничья'}`, 'info');
+            } else {
+                showNotification(`Матч #${data.match_id} завершен!`, 'success');
+            }
 
             
             if (currentMatch && data.match_id === currentMatch.id) {
                 await setupCurrentMatch(currentMatch.id);
-                loadStats(); 
+                if (!statsSubscribed) {
+                    loadStats();
+                }
             }
 
             loadActiveMatches();
             break;
 
+        case 'match_expired':
+            if (currentMatch && data.match_id === currentMatch.id) {
+                showNotification('Матч отменен', 'info');
+                await setupCurrentMatch(currentMatch.id);
+            }
+            break;
+
+        case 'lobby':
+            applyLobbyEvent(data);
+            break;
+
+        case 'queue_failed':
+            setMatchmakingActive(false);
+            showNotification('Не удалось создать матч, попробуйте еще раз', 'error');
+            break;
+
+        case 'queue_timeout':
+            setMatchmakingActive(false);
+            showNotification('Соперник не найден, попробуйте позже', 'info');
+            break;
+
+        case 'rate_limited':
+            showNotification('Слишком много сообщений, подождите немного', 'error');
+            break;
+
+        case 'stats':
+            if (data.platform) {
+                renderPlatformStats(data.platform);
+            }
+            if (data.user && currentUser && data.user.id === currentUser.id) {
+                renderUserStats(data.user);
+            }
+            break;
+
         case 'player_left':
             showNotification(`Игрок ${data.username || ''} покинул матч #${data.match_id}`, 'info');
 
@@ -1847,6 +2025,7 @@ window.platform = {
     loadStats,
     loadLeaderboard,
     createMatch,
+    findMatch,
     joinMatch,
     setupCurrentMatch,
     showPanel,